@@ -0,0 +1,111 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Tuple
+
+
+class Overloaded(Exception):
+    """Raised when a request is shed instead of waiting for an upstream slot"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Upstream saturated, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Bound concurrent upstream LLM calls and shed requests that would queue too long.
+
+    A request is rejected up front when the waiting line is full or the wait estimated
+    from measured upstream latency exceeds `max_wait`, and otherwise waits at most
+    `max_wait` seconds for a slot.
+    """
+
+    def __init__(self, max_in_flight: int = 8, max_waiting: int = 32, max_wait: float = 2.0, smoothing: float = 0.2):
+        self.max_in_flight = max_in_flight
+        self.max_waiting = max_waiting
+        self.max_wait = max_wait
+        self.smoothing = smoothing
+        self.semaphore = asyncio.Semaphore(max_in_flight)
+        self.in_flight = 0
+        self.waiting = 0
+        self.shed = 0
+        self.queue_seconds = 0.0
+        self.upstream_seconds = 0.0
+
+    def _smooth(self, average: float, sample: float) -> float:
+        return sample if average == 0 else average + self.smoothing * (sample - average)
+
+    def estimated_wait(self) -> float:
+        if self.in_flight < self.max_in_flight:
+            return 0.0
+        return (self.waiting + 1) / self.max_in_flight * self.upstream_seconds
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(max(self.estimated_wait(), self.upstream_seconds)))
+
+    def stats(self) -> Dict:
+        return {
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "shed": self.shed,
+            "avg_queue_ms": round(self.queue_seconds * 1000, 1),
+            "avg_upstream_ms": round(self.upstream_seconds * 1000, 1)
+        }
+
+    @asynccontextmanager
+    async def admit(self):
+        """Hold an upstream slot for the duration of the block, or raise Overloaded"""
+        if self.waiting >= self.max_waiting or self.estimated_wait() > self.max_wait:
+            self.shed += 1
+            raise Overloaded(self.retry_after())
+
+        queued = time.perf_counter()
+        # A free slot is taken at once; wait_for would hold it in the waiting line for a loop tick
+        if self.semaphore.locked():
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self.semaphore.acquire(), timeout=self.max_wait)
+            except asyncio.TimeoutError:
+                self.shed += 1
+                raise Overloaded(self.retry_after())
+            finally:
+                self.waiting -= 1
+        else:
+            await self.semaphore.acquire()
+
+        started = time.perf_counter()
+        self.queue_seconds = self._smooth(self.queue_seconds, started - queued)
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self.semaphore.release()
+            self.upstream_seconds = self._smooth(self.upstream_seconds, time.perf_counter() - started)
+
+
+class AnswerCache:
+    """Recent LLM answers, served in place of a fresh completion when chat load is shed"""
+
+    def __init__(self, max_entries: int = 2048):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[Tuple, str]" = OrderedDict()
+
+    @staticmethod
+    def key(skill: str, lab_id: str, content_hash: str, question: str) -> Tuple:
+        # Keyed on the lab's content hash so edited labs never serve stale answers
+        return (skill, lab_id, content_hash, " ".join(question.lower().split()).rstrip("?!. "))
+
+    def get(self, key: Tuple) -> Optional[str]:
+        answer = self.entries.get(key)
+        if answer is not None:
+            self.entries.move_to_end(key)
+        return answer
+
+    def put(self, key: Tuple, answer: str) -> None:
+        self.entries[key] = answer
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
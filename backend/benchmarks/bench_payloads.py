@@ -0,0 +1,67 @@
+"""Compare bytes on the wire and CPU per request for the lab endpoints.
+
+Run from the backend directory: python benchmarks/bench_payloads.py
+"""
+import json
+import os
+import sys
+import time
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compression import COMPRESSORS, PayloadCache, compress
+from main import lab_manager
+
+ITERATIONS = 200
+
+
+def default_fastapi_body(content) -> bytes:
+    """What FastAPI's default JSONResponse does for a returned dict"""
+    return json.dumps(
+        jsonable_encoder(content), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def time_per_call(function) -> float:
+    started = time.perf_counter()
+    for _ in range(ITERATIONS):
+        function()
+    return (time.perf_counter() - started) / ITERATIONS * 1_000_000
+
+
+def benchmark(name: str, content) -> None:
+    cache = PayloadCache()
+    payload = cache.get(name, "1", lambda: content)
+    baseline = default_fastapi_body(content)
+
+    print(f"\n{name}")
+    print(f"  {'strategy':<34}{'bytes':>10}{'us/request':>14}")
+    rows = [
+        ("default encoder (current)", len(baseline), time_per_call(lambda: default_fastapi_body(content))),
+        ("orjson per request", len(payload.body), time_per_call(lambda: orjson.dumps(content)))
+    ]
+    for encoding in COMPRESSORS:
+        rows.append((
+            f"orjson + {encoding} per request",
+            len(compress(payload.body, encoding)),
+            time_per_call(lambda: compress(orjson.dumps(content), encoding))
+        ))
+        payload.encode(encoding)
+        rows.append((
+            f"pre-encoded {encoding} (cached)",
+            len(payload.variants[encoding]),
+            time_per_call(lambda: payload.encode(encoding))
+        ))
+
+    for strategy, size, micros in rows:
+        print(f"  {strategy:<34}{size:>10}{micros:>14.1f}")
+
+
+if __name__ == "__main__":
+    benchmark("GET /labs", lab_manager.catalog)
+    for skill, labs in lab_manager.catalog.items():
+        for lab_id, lab_data in labs.items():
+            benchmark(f"GET /labs/{skill}/{lab_id}", {**lab_data, **lab_manager.versions[skill][lab_id]})
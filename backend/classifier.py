@@ -0,0 +1,132 @@
+import math
+import random
+import re
+from typing import Dict, List
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9_]+")
+# Function words and question phrasing carry no topic signal, only style
+STOP_WORDS = frozenset("""
+a about am an and are as at be been but by can could did do does doing for from had has have how i if in
+into is it its me my of on or our should so tell than that the their them then there these this those to
+was we were what whats when where which who whom why will with would you your
+""".split())
+
+# Off-topic questions the tutor should turn away, used as the negative class
+OFF_TOPIC_EXAMPLES = [
+    "Who is Rihanna?",
+    "What's the weather like today?",
+    "Who won the football game last night?",
+    "Tell me a joke",
+    "What is the capital of France?",
+    "Who is the president of the United States?",
+    "What movies are playing this weekend?",
+    "Can you recommend a good restaurant near me?",
+    "How old is Taylor Swift?",
+    "What time is it in Tokyo?",
+    "Write me a poem about love",
+    "What should I eat for dinner?",
+    "Who will win the election?",
+    "How tall is Mount Everest?",
+    "What is the meaning of life?",
+    "Tell me about the latest celebrity gossip",
+    "Which team is the best in the NBA?",
+    "How do I lose weight fast?",
+    "What is your favorite color?",
+    "Can you help me with my history homework?",
+    "Where should I go on vacation?",
+    "What's the score of the basketball game?",
+    "Who sang this song on the radio?",
+    "How do I bake chocolate chip cookies?",
+    "What is the stock price of Tesla?",
+    "Is it going to rain tomorrow?",
+    "Tell me a story about dragons",
+    "How many calories are in a banana?",
+    "What happened in the news today?",
+    "Who is the richest person in the world?",
+    "What are the rules of chess?",
+    "Recommend a TV show to watch",
+    "How do I fix my car engine?",
+    "What is the best phone to buy?",
+    "Who painted the Mona Lisa?",
+    "How far is the moon from the earth?",
+    "What is your name?",
+    "Are you a human?",
+    "Translate hello into Spanish",
+    "Give me dating advice",
+]
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase content-word tokens plus adjacent-word bigrams"""
+    words = [word for word in TOKEN_PATTERN.findall(text.lower()) if word not in STOP_WORDS]
+    return words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+
+
+class RelevanceClassifier:
+    """Logistic regression over TF-IDF features, small enough to train at startup"""
+
+    def __init__(self, threshold: float = 0.5, epochs: int = 30, learning_rate: float = 0.5, l2: float = 1e-3):
+        self.threshold = threshold
+        self.epochs = epochs
+        self.learning_rate = learning_rate
+        self.l2 = l2
+        self.idf: Dict[str, float] = {}
+        self.weights: Dict[str, float] = {}
+        self.bias = 0.0
+
+    def vectorize(self, text: str) -> Dict[str, float]:
+        counts: Dict[str, int] = {}
+        for token in tokenize(text):
+            if token in self.idf:
+                counts[token] = counts.get(token, 0) + 1
+
+        vector = {token: (1 + math.log(count)) * self.idf[token] for token, count in counts.items()}
+        norm = math.sqrt(sum(value * value for value in vector.values()))
+        return {token: value / norm for token, value in vector.items()} if norm else vector
+
+    def fit(self, relevant: List[str], off_topic: List[str]) -> "RelevanceClassifier":
+        documents = [(text, 1) for text in relevant] + [(text, 0) for text in off_topic]
+
+        document_frequency: Dict[str, int] = {}
+        for text, _ in documents:
+            for token in set(tokenize(text)):
+                document_frequency[token] = document_frequency.get(token, 0) + 1
+        self.idf = {
+            token: math.log((1 + len(documents)) / (1 + frequency)) + 1
+            for token, frequency in document_frequency.items()
+        }
+
+        # Weight classes inversely to their size so the few negatives still count
+        class_weights = {
+            1: len(documents) / (2 * max(1, len(relevant))),
+            0: len(documents) / (2 * max(1, len(off_topic)))
+        }
+        samples = [(self.vectorize(text), label) for text, label in documents]
+        rng = random.Random(0)
+        self.weights = {}
+        self.bias = 0.0
+
+        for epoch in range(self.epochs):
+            rng.shuffle(samples)
+            rate = self.learning_rate / (1 + epoch)
+            for vector, label in samples:
+                error = (self._score(vector) - label) * class_weights[label]
+                for token, value in vector.items():
+                    weight = self.weights.get(token, 0.0)
+                    self.weights[token] = weight - rate * (error * value + self.l2 * weight)
+                self.bias -= rate * error
+
+        return self
+
+    def _score(self, vector: Dict[str, float]) -> float:
+        logit = self.bias + sum(self.weights.get(token, 0.0) * value for token, value in vector.items())
+        return 1 / (1 + math.exp(-max(-30.0, min(30.0, logit))))
+
+    def predict_proba(self, text: str) -> float:
+        """Probability that a question is about the lab material"""
+        vector = self.vectorize(text)
+        # A question sharing no vocabulary with the corpus has no evidence of being on topic
+        return self._score(vector) if vector else 0.0
+
+    def is_relevant(self, text: str) -> bool:
+        return self.predict_proba(text) >= self.threshold
@@ -0,0 +1,162 @@
+import gzip
+from typing import Callable, Dict, List, Optional, Tuple
+
+import orjson
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Bodies smaller than this are not worth the CPU or the extra header
+COMPRESSION_MIN_BYTES = 1024
+
+# Dynamic responses use fast levels; static payloads are compressed once, so use the best ones
+COMPRESSORS: Dict[str, Tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]] = {
+    "gzip": (lambda body: gzip.compress(body, 6), lambda body: gzip.compress(body, 9))
+}
+if brotli is not None:
+    COMPRESSORS["br"] = (lambda body: brotli.compress(body, quality=4), lambda body: brotli.compress(body, quality=11))
+if zstandard is not None:
+    COMPRESSORS["zstd"] = (zstandard.ZstdCompressor(level=3).compress, zstandard.ZstdCompressor(level=19).compress)
+
+# Preferred order when the client accepts several encodings equally
+ENCODING_PREFERENCE = ("zstd", "br", "gzip")
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick the best supported encoding from an Accept-Encoding header, or None for identity"""
+    accepted = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                continue
+        accepted[name.strip().lower()] = quality
+
+    candidates = [
+        encoding for encoding in ENCODING_PREFERENCE
+        if encoding in COMPRESSORS and accepted.get(encoding, accepted.get("*", 0)) > 0
+    ]
+    if not candidates:
+        return None
+    return max(candidates, key=lambda encoding: accepted.get(encoding, accepted.get("*", 0)))
+
+
+def compress(body: bytes, encoding: str, static: bool = False) -> bytes:
+    fast, best = COMPRESSORS[encoding]
+    return best(body) if static else fast(body)
+
+
+def add_vary(headers: List[Tuple[bytes, bytes]], field: bytes) -> List[Tuple[bytes, bytes]]:
+    """Add a field to the response's Vary header, merging with one already set (e.g. by CORS)"""
+    for position, (name, value) in enumerate(headers):
+        if name.lower() == b"vary":
+            fields = [item.strip().lower() for item in value.split(b",")]
+            if field.lower() not in fields and b"*" not in fields:
+                headers[position] = (name, value + b", " + field)
+            return headers
+    return headers + [(b"vary", field)]
+
+
+class EncodedPayload:
+    """A JSON body serialized once, with each compressed variant built on first request"""
+
+    def __init__(self, version: str, body: bytes):
+        self.version = version
+        self.body = body
+        self.variants: Dict[str, bytes] = {}
+
+    def negotiate(self, accept_encoding: str) -> Optional[str]:
+        """The encoding `encode` would use for this Accept-Encoding header"""
+        return negotiate_encoding(accept_encoding) if len(self.body) >= COMPRESSION_MIN_BYTES else None
+
+    def encode(self, accept_encoding: str) -> Tuple[bytes, Optional[str]]:
+        encoding = self.negotiate(accept_encoding)
+        if encoding is None:
+            return self.body, None
+        if encoding not in self.variants:
+            self.variants[encoding] = compress(self.body, encoding, static=True)
+        return self.variants[encoding], encoding
+
+
+class PayloadCache:
+    """Pre-encoded bytes for static responses, rebuilt when their content version changes"""
+
+    def __init__(self):
+        self.payloads: Dict[str, EncodedPayload] = {}
+
+    def get(self, key: str, version: str, build: Callable[[], object]) -> EncodedPayload:
+        payload = self.payloads.get(key)
+        if payload is None or payload.version != version:
+            payload = EncodedPayload(version, orjson.dumps(build()))
+            self.payloads[key] = payload
+        return payload
+
+
+class CompressionMiddleware:
+    """Compress buffered HTTP responses above the size threshold with the negotiated encoding.
+
+    Streaming responses and bodies that already carry a Content-Encoding pass through untouched.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers", []))
+        encoding = negotiate_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            response_headers = [(name, value) for name, value in start_message.get("headers", [])]
+            already_encoded = any(name.lower() == b"content-encoding" for name, _ in response_headers)
+            body = message.get("body", b"")
+
+            # Only single-message bodies are buffered; streams go out as they are
+            if already_encoded or message.get("more_body", False) or len(body) < self.minimum_size:
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            body = compress(body, encoding)
+            response_headers = [
+                (name, value) for name, value in response_headers if name.lower() != b"content-length"
+            ] + [
+                (b"content-encoding", encoding.encode()),
+                (b"content-length", str(len(body)).encode())
+            ]
+            await send({**start_message, "headers": add_vary(response_headers, b"Accept-Encoding")})
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
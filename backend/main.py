@@ -1,18 +1,53 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import openai
 import os
+import asyncio
 from dotenv import load_dotenv
 import json
+import hashlib
+import hmac
+import secrets
+import math
 from typing import List, Dict, Optional
 import uvicorn
 import re
+import time
+import orjson
+from contextlib import asynccontextmanager
+from runner import ExerciseRunner
+from transcripts import create_transcript_log
+from classifier import OFF_TOPIC_EXAMPLES, RelevanceClassifier, tokenize
+from routing import ModelRouter
+from profiling import RequestProfiler, span
+from compression import CompressionMiddleware, EncodedPayload, PayloadCache
+from admission import AdmissionController, AnswerCache, Overloaded
+import logging
 
 # Load environment variables
 load_dotenv()
-
-app = FastAPI(title="CodeSafari 101 API", description="Backend for CodeSafari 101 learning platform")
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Run the exercise workers, transcript writer and lab content watch for the app's lifetime"""
+    global lab_watcher
+    await exercise_runner.start()
+    await transcript_log.start()
+    if LAB_CONTENT_DIR and LAB_RELOAD_INTERVAL > 0:
+        lab_watcher = asyncio.create_task(watch_lab_content())
+    yield
+    if lab_watcher is not None:
+        lab_watcher.cancel()
+    await exercise_runner.stop()
+    await transcript_log.stop()
+
+app = FastAPI(
+    title="CodeSafari 101 API",
+    description="Backend for CodeSafari 101 learning platform",
+    lifespan=lifespan
+)
 
 # CORS middleware to allow React frontend
 app.add_middleware(
@@ -23,8 +58,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize OpenAI client
-openai.api_key = os.getenv("OPENAI_API_KEY")
+# Opt-in request profiling (X-Profile header with PROFILE_TOKEN, or PROFILE_SAMPLE_RATE) and slow-request traces
+app.add_middleware(RequestProfiler, **RequestProfiler.settings_from_env())
+
+# Negotiated zstd/brotli/gzip compression for dynamic responses above the size threshold
+app.add_middleware(CompressionMiddleware)
 
 # Pydantic models
 class ChatRequest(BaseModel):
@@ -37,9 +75,315 @@ class ChatResponse(BaseModel):
     relevant: bool
     sources: Optional[List[str]] = None
 
+class RunRequest(BaseModel):
+    code: str
+    exercise: int
+
+class RunResponse(BaseModel):
+    passed: bool
+    results: List[Dict]
+    error: Optional[str] = None
+    stdout: Optional[str] = None
+    duration_ms: float
+
+# Fenced code blocks and the top-level symbols they define
+CODE_FENCE_PATTERN = re.compile(r"^```(\w*)\s*$")
+HEADING_PATTERN = re.compile(r"^#{1,6}\s+(.*\S)\s*$")
+SYMBOL_PATTERNS = {
+    "python": re.compile(r"^(?:async\s+)?(?:def|class)\s+(\w+)"),
+    "javascript": re.compile(r"^(?:async\s+)?(?:function\s+(\w+)|class\s+(\w+)|const\s+(\w+)\s*=\s*(?:async\s*)?\([^)]*\)\s*=>)"),
+}
+
+# A name written as code in a question: `name`, `name(...)` in backticks, or name( in prose
+CODE_MENTION_PATTERN = re.compile(r"`(\w+)(?:\([^`]*\))?`|\b(\w+)\(")
+
+def is_identifier_like(symbol: str) -> bool:
+    """Whether a symbol cannot be mistaken for a plain word (snake_case, camelCase, digits)"""
+    return "_" in symbol or any(char.isdigit() for char in symbol) or symbol not in (symbol.lower(), symbol.capitalize())
+
+# Programming vocabulary and typical student questions that seed the relevance classifier
+PROGRAMMING_KEYWORDS = [
+    'algorithm', 'algorithms', 'function', 'functions', 'code', 'implement', 'debug', 'error', 
+    'variable', 'variables', 'loop', 'loops', 'array', 'arrays', 'list', 'lists', 
+    'dict', 'dictionary', 'dictionaries', 'class', 'classes', 'object', 'objects',
+    'bfs', 'dfs', 'graph', 'graphs', 'tree', 'trees', 'sort', 'sorting', 'search', 
+    'python', 'javascript', 'react', 'html', 'css', 'programming', 'syntax',
+    'data', 'structure', 'structures', 'comprehension', 'comprehensions'
+]
+SAMPLE_LAB_QUESTIONS = [
+    "How does BFS work?",
+    "What's the difference between BFS and DFS?",
+    "How do I implement a queue in Python?",
+    "What are arrow functions?",
+    "How do I use async/await?",
+    "Explain event handling in JavaScript",
+    "Why is my code throwing an error?",
+    "Can you help me debug my function?",
+    "What is the time complexity of this algorithm?",
+    "How do I approach this exercise?"
+]
+QUESTION_TEMPLATES = ["What is {}?", "How does {} work?", "Explain {}", "Why use {}?"]
+
+# Definitions written as `- `term`: text` or `- **Term**: text` bullets in the readings
+DEFINITION_BULLET_PATTERN = re.compile(r"^[-*]\s+(?:`([^`]+)`|\*\*([^*]+?)\*\*)\s*:?\s*(.+)$")
+DEFINITION_QUESTION_PATTERN = re.compile(
+    r"^(?:what\s+(?:is|are|does)|what's|whats|define|meaning\s+of)\s+(?:an?\s+|the\s+)?(.+?)"
+    r"(?:\s+(?:do|does|mean|means|stand\s+for))?\s*\??$"
+)
+
+# Reading-time and prompt-budget estimates
+PROSE_WORDS_PER_MINUTE = 200
+CODE_LINES_PER_MINUTE = 15
+READING_TOKEN_BUDGET = int(os.getenv("READING_TOKEN_BUDGET", "1500"))
+
+# Optional directory of `<skill>/<lab_id>.json` labs layered over the built-in content
+LAB_CONTENT_DIR = os.getenv("LAB_CONTENT_DIR")
+LAB_REQUIRED_FIELDS = ("title", "reading", "exercises", "lab_description")
+
+def estimate_tokens(text: str) -> int:
+    """Approximate GPT token count (about four characters per token for English and code)"""
+    return max(1, math.ceil(len(text) / 4))
+
+def hash_content(value) -> str:
+    """Stable short hash of any JSON-serializable lab content"""
+    return hashlib.sha256(json.dumps(value, sort_keys=True).encode()).hexdigest()[:16]
+
 class LabManager:
     def __init__(self):
-        self.labs = self.load_lab_content()
+        self.version = 0
+        self.versions = {}
+        self.removed = {}
+        self.signature = self.content_signature()
+        self.labs = self.read_labs()
+        self.update_versions()
+        # Versions are per-process counters, so cursors carry a nonce unique to this process;
+        # a cursor from any other process (restart, redeploy, sibling worker) gets the full set
+        self.epoch = secrets.token_hex(8)
+        self.code_index = self.build_code_index()
+        self.glossary = self.build_glossary()
+        self.relevance_classifier = self.build_relevance_classifier()
+        self.analytics = {}
+        self.update_analytics()
+        self.catalog = self.build_catalog()
+    
+    def reload_labs(self) -> int:
+        """Reload lab content, bump versions for whatever changed and rebuild derived indexes.
+        
+        Returns how many labs had their statistics recomputed; unchanged labs keep theirs.
+        """
+        self.signature = self.content_signature()
+        self.labs = self.read_labs()
+        if not self.update_versions():
+            return 0
+        self.code_index = self.build_code_index()
+        self.glossary = self.build_glossary()
+        self.relevance_classifier = self.build_relevance_classifier()
+        recomputed = self.update_analytics()
+        self.catalog = self.build_catalog()
+        return recomputed
+    
+    def content_signature(self) -> tuple:
+        """Paths, sizes and modification times of the lab files in LAB_CONTENT_DIR"""
+        if not LAB_CONTENT_DIR or not os.path.isdir(LAB_CONTENT_DIR):
+            return ()
+        signature = []
+        for root, _, files in os.walk(LAB_CONTENT_DIR):
+            for name in files:
+                if name.endswith(".json"):
+                    stat = os.stat(os.path.join(root, name))
+                    signature.append((os.path.join(root, name), stat.st_size, stat.st_mtime_ns))
+        return tuple(sorted(signature))
+    
+    def read_labs(self) -> Dict:
+        """Built-in labs with any JSON labs from LAB_CONTENT_DIR replacing or adding to them"""
+        labs = self.load_lab_content()
+        if not LAB_CONTENT_DIR or not os.path.isdir(LAB_CONTENT_DIR):
+            return labs
+        
+        for skill in sorted(os.listdir(LAB_CONTENT_DIR)):
+            skill_dir = os.path.join(LAB_CONTENT_DIR, skill)
+            if not os.path.isdir(skill_dir):
+                continue
+            for name in sorted(os.listdir(skill_dir)):
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(skill_dir, name)
+                with open(path, encoding="utf-8") as lab_file:
+                    lab_data = json.load(lab_file)
+                missing = [field for field in LAB_REQUIRED_FIELDS if field not in lab_data]
+                if missing:
+                    raise ValueError(f"{path} is missing {', '.join(missing)}")
+                labs.setdefault(skill, {})[name[:-len(".json")]] = lab_data
+        return labs
+    
+    def compute_lab_stats(self, skill: str, lab_id: str) -> Dict:
+        """Reading statistics and per-section token counts for one lab"""
+        lab_data = self.labs[skill][lab_id]
+        blocks = self.code_index[skill][lab_id]["blocks"]
+        code_lines = sum(len(block["code"].splitlines()) for block in blocks)
+        words = len(lab_data["reading"].split())
+        code_words = sum(len(block["code"].split()) for block in blocks)
+        sections = [
+            {**section, "tokens": estimate_tokens(section["content"])}
+            for section in self.split_sections(lab_data["reading"])
+        ]
+        
+        return {
+            "stats": {
+                "reading_words": words,
+                "reading_tokens": estimate_tokens(lab_data["reading"]),
+                "reading_minutes": max(1, math.ceil((words - code_words) / PROSE_WORDS_PER_MINUTE + code_lines / CODE_LINES_PER_MINUTE)),
+                "sections": len(sections),
+                "code_blocks": len(blocks),
+                "code_lines": code_lines,
+                "exercises": len(lab_data["exercises"]),
+                "runnable_exercises": len(lab_data.get("exercise_tests", []))
+            },
+            "sections": sections
+        }
+    
+    def update_analytics(self) -> int:
+        """Recompute statistics only for labs whose content hash changed since they were computed"""
+        analytics = {}
+        recomputed = 0
+        for skill, labs in self.labs.items():
+            analytics[skill] = {}
+            for lab_id in labs:
+                content_hash = self.versions[skill][lab_id]["content_hash"]
+                cached = self.analytics.get(skill, {}).get(lab_id)
+                if cached and cached["content_hash"] == content_hash:
+                    analytics[skill][lab_id] = cached
+                else:
+                    analytics[skill][lab_id] = {"content_hash": content_hash, **self.compute_lab_stats(skill, lab_id)}
+                    recomputed += 1
+        self.analytics = analytics
+        return recomputed
+    
+    def build_catalog(self) -> Dict:
+        """Lab content with statistics attached, as served by the catalog endpoint"""
+        # Exercise test cases stay server-side; clients only learn which exercises can be run
+        return {
+            skill: {
+                lab_id: {
+                    **{key: value for key, value in lab_data.items() if key != "exercise_tests"},
+                    "runnable": [
+                        {"exercise": tests["exercise"], "entrypoint": tests["entrypoint"]}
+                        for tests in lab_data.get("exercise_tests", [])
+                    ],
+                    "stats": self.analytics[skill][lab_id]["stats"]
+                }
+                for lab_id, lab_data in labs.items()
+            }
+            for skill, labs in self.labs.items()
+        }
+    
+    def select_reading(self, question: str, skill: str, lab_id: str) -> str:
+        """Fit the reading into the prompt budget, keeping the sections that best match the question"""
+        lab_analytics = self.analytics[skill][lab_id]
+        if lab_analytics["stats"]["reading_tokens"] <= READING_TOKEN_BUDGET:
+            return self.labs[skill][lab_id]["reading"]
+        
+        question_words = set(tokenize(question))
+        sections = lab_analytics["sections"]
+        ranked = sorted(
+            range(len(sections)),
+            key=lambda position: -len(question_words & set(tokenize(sections[position]["content"])))
+        )
+        
+        chosen = set()
+        used = 0
+        for position in ranked:
+            if used + sections[position]["tokens"] <= READING_TOKEN_BUDGET:
+                chosen.add(position)
+                used += sections[position]["tokens"]
+        
+        return "\n\n".join(sections[position]["content"] for position in sorted(chosen))
+    
+    def split_sections(self, reading: str) -> List[Dict]:
+        """Split a reading into its top-level "## " chapters, keeping any preamble as the first section"""
+        sections = [{"title": "", "lines": []}]
+        for line in reading.strip().splitlines():
+            if line.startswith("## "):
+                sections.append({"title": line[3:].strip(), "lines": []})
+            sections[-1]["lines"].append(line)
+        return [
+            {"title": section["title"], "content": "\n".join(section["lines"])}
+            for section in sections if section["lines"]
+        ]
+    
+    def update_versions(self) -> bool:
+        """Hash every lab and section, assigning a new version to whatever changed since the last call"""
+        next_version = self.version + 1
+        changed = False
+        
+        for skill, labs in self.labs.items():
+            for lab_id, lab_data in labs.items():
+                previous = self.versions.get(skill, {}).get(lab_id)
+                content_hash = hash_content(lab_data)
+                if previous and previous["content_hash"] == content_hash:
+                    continue
+                
+                previous_sections = {section["title"]: section for section in previous["sections"]} if previous else {}
+                sections = []
+                for section in self.split_sections(lab_data["reading"]):
+                    section_hash = hash_content(section["content"])
+                    old_section = previous_sections.get(section["title"])
+                    unchanged = old_section and old_section["content_hash"] == section_hash
+                    sections.append({
+                        "title": section["title"],
+                        "content_hash": section_hash,
+                        "version": old_section["version"] if unchanged else next_version
+                    })
+                
+                self.versions.setdefault(skill, {})[lab_id] = {
+                    "version": next_version,
+                    "content_hash": content_hash,
+                    "sections": sections
+                }
+                self.removed.pop((skill, lab_id), None)
+                changed = True
+        
+        for skill in list(self.versions):
+            for lab_id in list(self.versions[skill]):
+                if lab_id not in self.labs.get(skill, {}):
+                    del self.versions[skill][lab_id]
+                    self.removed[(skill, lab_id)] = next_version
+                    changed = True
+        
+        if changed:
+            self.version = next_version
+        return changed
+    
+    def get_changes(self, cursor: str) -> Dict:
+        """Labs and sections changed after the `epoch:version` cursor, plus labs removed after it"""
+        # A cursor minted by another process, or one ahead of us, gets the full change set
+        epoch, _, version = cursor.partition(":")
+        since = int(version) if epoch == self.epoch and version.isdigit() else 0
+        if since > self.version:
+            since = 0
+        
+        changed = []
+        for skill, labs in self.versions.items():
+            for lab_id, lab_version in labs.items():
+                if lab_version["version"] > since:
+                    changed.append({
+                        "skill": skill,
+                        "lab_id": lab_id,
+                        "version": lab_version["version"],
+                        "content_hash": lab_version["content_hash"],
+                        "sections": [section for section in lab_version["sections"] if section["version"] > since]
+                    })
+        
+        removed = [
+            {"skill": skill, "lab_id": lab_id, "version": version}
+            for (skill, lab_id), version in self.removed.items() if version > since
+        ]
+        return {
+            "cursor": f"{self.epoch}:{self.version}",
+            "version": self.version,
+            "changed": changed,
+            "removed": removed
+        }
     
     def load_lab_content(self) -> Dict:
         """Load comprehensive lab content for all skills"""
@@ -47,6 +391,7 @@ class LabManager:
             "python": {
                 "python-basics": {
                     "title": "Python Fundamentals & Data Structures",
+                    "difficulty": "Beginner",
                     "reading": """
 # Python Fundamentals & Data Structures
 
@@ -226,10 +571,31 @@ Consider memory usage alongside time complexity:
                         "Implement a spell checker using sets for fast word lookup",
                         "Create a student grade book with statistical analysis (mean, median, mode, standard deviation)"
                     ],
+                    "exercise_tests": [
+                        {
+                            "exercise": 0,
+                            "entrypoint": "find_duplicates",
+                            "cases": [
+                                {"call": "sorted(find_duplicates([1, 2, 3, 2, 1, 5]))", "expected": [1, 2]},
+                                {"call": "sorted(find_duplicates(['a', 'b', 'c']))", "expected": []},
+                                {"call": "sorted(find_duplicates([]))", "expected": []}
+                            ]
+                        },
+                        {
+                            "exercise": 2,
+                            "entrypoint": "LRUCache",
+                            "cases": [
+                                {"call": "(lambda c: [c.put(1, 1), c.put(2, 2), c.get(1), c.put(3, 3), c.get(2), c.get(3)])(LRUCache(2))[2:]", "expected": [1, None, -1, 3]},
+                                {"call": "(lambda c: [c.put(1, 1), c.put(1, 10), c.get(1)][-1])(LRUCache(1))", "expected": 10},
+                                {"call": "LRUCache(2).get(42)", "expected": -1}
+                            ]
+                        }
+                    ],
                     "lab_description": "Build a comprehensive student management system with grade analysis, statistical reporting, and data visualization. Implement efficient algorithms for searching, sorting, and analyzing student performance data."
                 },
                 "python-algorithms": {
                     "title": "Graph Algorithms & BFS/DFS",
+                    "difficulty": "Intermediate",
                     "reading": """
 # Graph Algorithms: Breadth-First Search and Depth-First Search
 
@@ -529,10 +895,47 @@ def find_connected_components(graph):
                         "Implement topological sorting using DFS for course prerequisite scheduling",
                         "Find all connected components in an undirected graph"
                     ],
+                    "exercise_tests": [
+                        {
+                            "exercise": 0,
+                            "entrypoint": "bfs_shortest_path",
+                            "cases": [
+                                {"call": "(lambda p: [p[0], p[-1], len(p)])(bfs_shortest_path({'A': ['B', 'C'], 'B': ['A', 'D'], 'C': ['A', 'D'], 'D': ['B', 'C', 'E'], 'E': ['D']}, 'A', 'E'))", "expected": ["A", "E", 4]},
+                                {"call": "bfs_shortest_path({'A': ['B'], 'B': ['A']}, 'A', 'A')", "expected": ["A"]},
+                                {"call": "bfs_shortest_path({'A': ['B'], 'B': ['A'], 'C': []}, 'A', 'C')", "expected": None}
+                            ]
+                        },
+                        {
+                            "exercise": 1,
+                            "entrypoint": "has_cycle_directed",
+                            "cases": [
+                                {"call": "has_cycle_directed({0: [1], 1: [2], 2: [0]})", "expected": True},
+                                {"call": "has_cycle_directed({0: [1, 2], 1: [2], 2: []})", "expected": False},
+                                {"call": "has_cycle_directed({0: [0]})", "expected": True}
+                            ]
+                        },
+                        {
+                            "exercise": 2,
+                            "entrypoint": "flood_fill",
+                            "cases": [
+                                {"call": "flood_fill([[1, 1, 1], [1, 1, 0], [1, 0, 1]], 1, 1, 2)", "expected": [[2, 2, 2], [2, 2, 0], [2, 0, 1]]},
+                                {"call": "flood_fill([[0, 0], [0, 0]], 0, 0, 0)", "expected": [[0, 0], [0, 0]]}
+                            ]
+                        },
+                        {
+                            "exercise": 6,
+                            "entrypoint": "find_connected_components",
+                            "cases": [
+                                {"call": "sorted(sorted(c) for c in find_connected_components({1: [2], 2: [1], 3: [4], 4: [3], 5: []}))", "expected": [[1, 2], [3, 4], [5]]},
+                                {"call": "len(find_connected_components({}))", "expected": 0}
+                            ]
+                        }
+                    ],
                     "lab_description": "Build a comprehensive social network analysis tool that can find shortest connections between people, detect communities (connected components), analyze influence paths, and visualize network structures. Implement both BFS and DFS algorithms to solve real-world graph problems."
                 },
                 "python-advanced": {
                     "title": "Object-Oriented Design Patterns",
+                    "difficulty": "Advanced",
                     "reading": """
 # Object-Oriented Programming & Design Patterns
 
@@ -584,6 +987,7 @@ Allows objects to notify other objects about state changes.
             "javascript": {
                 "js-fundamentals": {
                     "title": "Modern JavaScript & DOM Manipulation",
+                    "difficulty": "Beginner",
                     "reading": """
 # Modern JavaScript & DOM Manipulation
 
@@ -644,6 +1048,7 @@ button.addEventListener('click', (event) => {
                 },
                 "js-algorithms": {
                     "title": "Data Structures in JavaScript",
+                    "difficulty": "Intermediate",
                     "reading": """
 # Data Structures in JavaScript
 
@@ -714,6 +1119,7 @@ class Queue {
                 },
                 "js-react": {
                     "title": "React Components & State Management",
+                    "difficulty": "Advanced",
                     "reading": """
 # React Components & State Management
 
@@ -789,78 +1195,338 @@ function DataFetcher({ render }) {
             }
         }
     
+    def extract_code_blocks(self, reading: str) -> List[Dict]:
+        """Extract fenced code blocks with their language, section and defined symbols"""
+        blocks = []
+        section = ""
+        language = None
+        code_lines: List[str] = []
+        
+        for line in reading.splitlines():
+            fence = CODE_FENCE_PATTERN.match(line.strip())
+            if language is None:
+                if fence:
+                    language = fence.group(1).lower() or "text"
+                    code_lines = []
+                    continue
+                heading = HEADING_PATTERN.match(line)
+                if heading:
+                    section = heading.group(1)
+                continue
+            
+            if fence and not fence.group(1):
+                pattern = SYMBOL_PATTERNS.get(language)
+                symbols = []
+                if pattern:
+                    for code_line in code_lines:
+                        match = pattern.match(code_line)
+                        if match:
+                            symbols.append(next(name for name in match.groups() if name))
+                blocks.append({
+                    "language": language,
+                    "section": section,
+                    "symbols": symbols,
+                    "code": "\n".join(code_lines)
+                })
+                language = None
+                continue
+            code_lines.append(line)
+        
+        return blocks
+    
+    def build_code_index(self) -> Dict:
+        """Precompute code blocks and a symbol lookup table for every lab"""
+        index = {}
+        for skill, labs in self.labs.items():
+            index[skill] = {}
+            for lab_id, lab_data in labs.items():
+                blocks = self.extract_code_blocks(lab_data["reading"])
+                symbols = {}
+                for position, block in enumerate(blocks):
+                    for symbol in block["symbols"]:
+                        symbols.setdefault(symbol.lower(), []).append(position)
+                index[skill][lab_id] = {"blocks": blocks, "symbols": symbols}
+        return index
+    
+    def find_code_snippets(self, question: str, skill: str, lab_id: str) -> List[Dict]:
+        """Return the indexed code blocks whose symbols are mentioned in the question"""
+        lab_index = self.code_index.get(skill, {}).get(lab_id)
+        if not lab_index:
+            return []
+        
+        # Word-like symbols (add, Stack) only count when written as code, e.g. add( or `Stack`
+        words = set(re.findall(r"\w+", question.lower()))
+        code_mentions = {
+            (quoted or called).lower() for quoted, called in CODE_MENTION_PATTERN.findall(question)
+        }
+        
+        return [
+            block for block in lab_index["blocks"]
+            if any(
+                symbol.lower() in code_mentions or (symbol.lower() in words and is_identifier_like(symbol))
+                for symbol in block["symbols"]
+            )
+        ]
+    
+    def build_relevance_classifier(self) -> RelevanceClassifier:
+        """Train the local relevance classifier on the lab corpus versus off-topic questions"""
+        corpus = [" ".join(PROGRAMMING_KEYWORDS)] + SAMPLE_LAB_QUESTIONS
+        topics = set(PROGRAMMING_KEYWORDS)
+        for skill, labs in self.labs.items():
+            for lab_id, lab_data in labs.items():
+                corpus.append(lab_data["title"])
+                corpus.append(lab_data["lab_description"])
+                corpus.extend(lab_data["exercises"])
+                corpus.extend(line.strip() for line in lab_data["reading"].splitlines() if len(line.strip()) > 3)
+                topics.update(self.glossary[skill][lab_id])
+                topics.update(self.code_index[skill][lab_id]["symbols"])
+                for line in lab_data["reading"].splitlines():
+                    heading = HEADING_PATTERN.match(line)
+                    if heading:
+                        topics.add(re.sub(r"^(?:chapter\s+)?[\d.]*:?\s*", "", heading.group(1).lower()).strip(" ?:"))
+        
+        # The readings are declarative, so phrase every lab topic as a student would ask it
+        corpus.extend(template.format(topic) for topic in sorted(topics) if topic for template in QUESTION_TEMPLATES)
+        
+        return RelevanceClassifier().fit(corpus, OFF_TOPIC_EXAMPLES)
+    
+    def build_glossary(self) -> Dict:
+        """Collect term definitions from each reading for extractive answers"""
+        glossary = {}
+        for skill, labs in self.labs.items():
+            glossary[skill] = {}
+            for lab_id, lab_data in labs.items():
+                terms = {}
+                section = ""
+                in_code = False
+                for line in lab_data["reading"].splitlines():
+                    stripped = line.strip()
+                    if stripped.startswith("```"):
+                        in_code = not in_code
+                        continue
+                    heading = HEADING_PATTERN.match(stripped)
+                    if in_code or heading:
+                        section = heading.group(1) if heading else section
+                        continue
+                    
+                    match = DEFINITION_BULLET_PATTERN.match(stripped)
+                    if not match or not match.group(3).strip():
+                        continue
+                    term = match.group(1) or match.group(2)
+                    entry = {"term": term, "definition": match.group(3).strip(), "section": section}
+                    # "O(n log n) - Linearithmic Time" is reachable by either name, `append(x)` as "append"
+                    aliases = [term.split("(")[0]] if match.group(1) else term.split(" - ")
+                    for alias in [term, *aliases]:
+                        alias = alias.strip().lower()
+                        if alias:
+                            terms.setdefault(alias, entry)
+                glossary[skill][lab_id] = terms
+        return glossary
+    
+    def answer_definition(self, question: str, skill: str, lab_id: str) -> Optional[Dict]:
+        """Answer "what is X" style questions straight from the reading, if X is defined there"""
+        match = DEFINITION_QUESTION_PATTERN.match(question.strip().lower())
+        if not match:
+            return None
+        
+        terms = self.glossary.get(skill, {}).get(lab_id, {})
+        term = match.group(1).strip().strip("`").strip()
+        for candidate in (term, term.rstrip("s"), term.split("(")[0].strip() if not term.startswith("o(") else term):
+            if candidate in terms:
+                return terms[candidate]
+        return None
+    
     def get_relevant_content(self, question: str, skill: str, lab_id: str) -> str:
         """Simple keyword-based RAG to find relevant lab content"""
         if skill not in self.labs or lab_id not in self.labs[skill]:
             return ""
         
         lab_data = self.labs[skill][lab_id]
-        question_lower = question.lower()
-        
-        # Check if question contains programming-related keywords
-        programming_keywords = [
-            'algorithm', 'algorithms', 'function', 'functions', 'code', 'implement', 'debug', 'error', 
-            'variable', 'variables', 'loop', 'loops', 'array', 'arrays', 'list', 'lists', 
-            'dict', 'dictionary', 'dictionaries', 'class', 'classes', 'object', 'objects',
-            'bfs', 'dfs', 'graph', 'graphs', 'tree', 'trees', 'sort', 'sorting', 'search', 
-            'python', 'javascript', 'react', 'html', 'css', 'programming', 'syntax',
-            'data', 'structure', 'structures', 'comprehension', 'comprehensions',
-            'what', 'how', 'why', 'when', 'where', 'explain', 'help', 'tutorial'
-        ]
         
         # Check if question is programming-related
-        if not any(keyword in question_lower for keyword in programming_keywords):
+        if not self.relevance_classifier.is_relevant(question):
             return ""
         
         # Combine all lab content for context
         context_parts = [
             f"Lab Title: {lab_data['title']}",
-            f"Reading Material:\n{lab_data['reading']}",
+            f"Reading Material:\n{self.select_reading(question, skill, lab_id)}",
             f"Exercises: {', '.join(lab_data['exercises'])}",
             f"Lab Project: {lab_data['lab_description']}"
         ]
         
+        # Attach the exact snippets the question refers to by name
+        for block in self.find_code_snippets(question, skill, lab_id):
+            context_parts.append(
+                f"Referenced Code ({', '.join(block['symbols'])} in \"{block['section']}\"):\n"
+                f"```{block['language']}\n{block['code']}\n```"
+            )
+        
         return "\n\n".join(context_parts)
 
 # Initialize lab manager
 lab_manager = LabManager()
+# Shared secret for POST /labs/reload; reloading is disabled when unset
+LAB_RELOAD_TOKEN = os.getenv("LAB_RELOAD_TOKEN")
+# Seconds between checks of LAB_CONTENT_DIR for edited lab files; 0 disables the watch
+LAB_RELOAD_INTERVAL = float(os.getenv("LAB_RELOAD_INTERVAL", "5"))
+
+lab_watcher: Optional[asyncio.Task] = None
+
+async def watch_lab_content():
+    """Reload labs whenever a file in LAB_CONTENT_DIR is added, removed or edited"""
+    while True:
+        await asyncio.sleep(LAB_RELOAD_INTERVAL)
+        try:
+            if lab_manager.content_signature() == lab_manager.signature:
+                continue
+            recomputed = lab_manager.reload_labs()
+            logging.info("Reloaded lab content: version %s, stats recomputed for %s labs", lab_manager.version, recomputed)
+        except (OSError, ValueError) as e:
+            logging.error("Lab content not reloaded: %s", e)
+
+# Pool of sandboxed workers for running exercise submissions
+exercise_runner = ExerciseRunner(
+    size=int(os.getenv("EXERCISE_WORKERS", "4")),
+    timeout=float(os.getenv("EXERCISE_TIMEOUT_SECONDS", "5")),
+    memory_mb=int(os.getenv("EXERCISE_MEMORY_MB", "256")),
+    sandbox_user=os.getenv("EXERCISE_SANDBOX_USER", "nobody")
+)
+
+# Chooses the model tier and output budget for each question that reaches the LLM
+model_router = ModelRouter.from_env()
+
+# Bounds concurrent upstream chat calls and sheds load early instead of queueing in uvicorn
+chat_admission = AdmissionController(
+    max_in_flight=int(os.getenv("CHAT_MAX_IN_FLIGHT", "8")),
+    max_waiting=int(os.getenv("CHAT_MAX_WAITING", "32")),
+    max_wait=float(os.getenv("CHAT_MAX_QUEUE_SECONDS", "2"))
+)
+answer_cache = AnswerCache()
+
+# Chat transcripts are queued in-process and written in batches off the request path
+transcript_log = create_transcript_log(os.getenv("TRANSCRIPT_LOG", "transcripts.db"))
 
 @app.get("/")
 async def root():
     """Health check endpoint"""
-    return {"message": "CodeSafari 101 API is running!"}
+    return {"message": "CodeSafari 101 API is running!", "chat": chat_admission.stats()}
+
+# Static lab payloads are serialized and compressed once per content version
+payload_cache = PayloadCache()
+
+def orjson_response(content) -> Response:
+    """Serialize a dynamic payload with orjson; the CompressionMiddleware handles encoding"""
+    return Response(content=orjson.dumps(content), media_type="application/json")
+
+def encoded_json_response(request: Request, payload: EncodedPayload, headers: Optional[Dict[str, str]] = None) -> Response:
+    body, encoding = payload.encode(request.headers.get("accept-encoding", ""))
+    headers = {**(headers or {}), "Vary": "Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Whether an If-None-Match header lists `etag` (weak comparison, as RFC 9110 requires)"""
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in [tag[2:] if tag.startswith("W/") else tag for tag in tags]
 
 @app.get("/labs")
-async def get_labs():
+async def get_labs(request: Request):
     """Get all available labs organized by skill"""
-    return lab_manager.labs
+    payload = payload_cache.get("catalog", str(lab_manager.version), lambda: lab_manager.catalog)
+    return encoded_json_response(request, payload)
+
+@app.get("/labs/changes")
+async def get_lab_changes(since: str = ""):
+    """Get the labs and sections that changed after the cursor returned by a previous call"""
+    return orjson_response(lab_manager.get_changes(since))
+
+@app.post("/labs/reload")
+async def reload_labs(request: Request):
+    """Re-read lab content (LAB_CONTENT_DIR) and publish whatever changed"""
+    if not LAB_RELOAD_TOKEN:
+        raise HTTPException(status_code=403, detail="Lab reload is disabled")
+    if not hmac.compare_digest(request.headers.get("x-admin-token", ""), LAB_RELOAD_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+    
+    # Rebuilt on the event loop so no request sees a half-updated index
+    try:
+        recomputed = lab_manager.reload_labs()
+    except (OSError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Lab content not reloaded: {e}")
+    return {
+        "cursor": f"{lab_manager.epoch}:{lab_manager.version}",
+        "version": lab_manager.version,
+        "recomputed_stats": recomputed
+    }
 
 @app.get("/labs/{skill}/{lab_id}")
-async def get_lab_detail(skill: str, lab_id: str):
+async def get_lab_detail(skill: str, lab_id: str, request: Request):
     """Get detailed content for a specific lab"""
     if skill not in lab_manager.labs or lab_id not in lab_manager.labs[skill]:
         raise HTTPException(status_code=404, detail="Lab not found")
     
-    return lab_manager.labs[skill][lab_id]
+    lab_version = lab_manager.versions[skill][lab_id]
+    with span("lab_payload"):
+        payload = payload_cache.get(
+            f"lab:{skill}:{lab_id}",
+            lab_version["content_hash"],
+            lambda: {**lab_manager.catalog[skill][lab_id], **lab_version}
+        )
+        # Each encoding is a different body, so each gets its own validator
+        encoding = payload.negotiate(request.headers.get("accept-encoding", ""))
+        etag = f'"{lab_version["content_hash"]}-{encoding or "identity"}"'
+        if etag_matches(request.headers.get("if-none-match", ""), etag):
+            return Response(status_code=304, headers={"ETag": etag, "Vary": "Accept-Encoding"})
+        return encoded_json_response(request, payload, {"ETag": etag})
+
+@app.get("/labs/{skill}/{lab_id}/code")
+async def get_lab_code(skill: str, lab_id: str, symbol: Optional[str] = None):
+    """Get the precomputed code blocks for a lab, optionally filtered by symbol name"""
+    if skill not in lab_manager.code_index or lab_id not in lab_manager.code_index[skill]:
+        raise HTTPException(status_code=404, detail="Lab not found")
+    
+    lab_index = lab_manager.code_index[skill][lab_id]
+    if symbol is None:
+        return orjson_response(lab_index)
+    
+    positions = lab_index["symbols"].get(symbol.lower())
+    if not positions:
+        raise HTTPException(status_code=404, detail="Symbol not found")
+    
+    return orjson_response({"blocks": [lab_index["blocks"][position] for position in positions]})
+
+@app.post("/labs/{skill}/{lab_id}/run", response_model=RunResponse)
+async def run_exercise(skill: str, lab_id: str, request: RunRequest):
+    """Run a student's submission against the test cases for one exercise"""
+    if skill not in lab_manager.labs or lab_id not in lab_manager.labs[skill]:
+        raise HTTPException(status_code=404, detail="Lab not found")
+    if skill != "python":
+        raise HTTPException(status_code=400, detail="Only Python exercises can be run")
+    
+    tests = next(
+        (tests for tests in lab_manager.labs[skill][lab_id].get("exercise_tests", []) if tests["exercise"] == request.exercise),
+        None
+    )
+    if tests is None:
+        raise HTTPException(status_code=404, detail="No tests available for this exercise")
+    
+    outcome = await exercise_runner.run(request.code, tests["cases"])
+    
+    return RunResponse(
+        passed=outcome["error"] is None and all(result["passed"] for result in outcome["results"]),
+        results=outcome["results"],
+        error=outcome["error"],
+        stdout=outcome.get("stdout"),
+        duration_ms=outcome["duration_ms"]
+    )
 
-@app.post("/chat", response_model=ChatResponse)
-async def chat_with_ai(request: ChatRequest):
-    """RAG-powered chatbot endpoint"""
-    try:
-        # Get relevant content using simplified RAG
-        context = lab_manager.get_relevant_content(request.question, request.skill, request.lab_id)
-        
-        # Check if question is relevant to lab content
-        if not context:
-            return ChatResponse(
-                response="I can only help with questions related to the current lab. Please ask about the lab content, concepts, exercises, or implementation details.",
-                relevant=False
-            )
-        
-        sources = ["Lab content"]
-        
-        # Create GPT prompt with RAG context
-        system_prompt = f"""You are a helpful coding tutor for CodeSafari 101, specifically helping with lab exercises. 
+REJECTION_MESSAGE = "I can only help with questions related to the current lab. Please ask about the lab content, concepts, exercises, or implementation details."
+
+def build_system_prompt(context: str) -> str:
+    """Create GPT prompt with RAG context"""
+    return f"""You are a helpful coding tutor for CodeSafari 101, specifically helping with lab exercises. 
 
 You can only answer questions related to the current lab content provided below. If a question is unrelated to programming, algorithms, or the specific lab content, politely redirect the student to focus on the lab.
 
@@ -875,27 +1541,315 @@ Guidelines:
 - If asked about unrelated topics (like celebrities, sports, etc.), politely redirect to lab content
 """
 
-        # Call OpenAI API
-        response = openai.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": request.question}
-            ],
-            max_tokens=400,
-            temperature=0.7
+async def answer_locally(request: ChatRequest, context: str, started: float) -> Optional[ChatResponse]:
+    """Reject off-topic questions and answer definitional ones without calling the LLM"""
+    # Check if question is relevant to lab content
+    if not context:
+        await transcript_log.record(
+            skill=request.skill,
+            lab_id=request.lab_id,
+            question=request.question,
+            response=REJECTION_MESSAGE,
+            relevant=False,
+            latency_ms=(time.perf_counter() - started) * 1000
         )
+        return ChatResponse(
+            response=REJECTION_MESSAGE,
+            relevant=False
+        )
+    
+    # Definitional questions are answered straight from the reading, without the LLM
+    definition = lab_manager.answer_definition(request.question, request.skill, request.lab_id)
+    if definition:
+        answer = f"{definition['term']}: {definition['definition'].rstrip('.')}. See \"{definition['section']}\" in the reading for more detail."
+        await transcript_log.record(
+            skill=request.skill,
+            lab_id=request.lab_id,
+            question=request.question,
+            response=answer,
+            relevant=True,
+            model="extractive",
+            latency_ms=(time.perf_counter() - started) * 1000
+        )
+        return ChatResponse(
+            response=answer,
+            relevant=True,
+            sources=[f"Reading: {definition['section']}"]
+        )
+    
+    return None
+
+def route_question(request: ChatRequest) -> Dict:
+    lab_data = lab_manager.labs[request.skill][request.lab_id]
+    return model_router.route(
+        request.question,
+        request.skill,
+        request.lab_id,
+        lab_data.get("difficulty"),
+        lab_manager.relevance_classifier.predict_proba(request.question)
+    )
+
+def get_sources(request: ChatRequest) -> List[str]:
+    sources = ["Lab content"]
+    for block in lab_manager.find_code_snippets(request.question, request.skill, request.lab_id):
+        sources.append(f"Code: {', '.join(block['symbols'])}")
+    return sources
+
+# Async client so upstream calls never block the event loop, created on first use so a missing key only fails chat
+async_openai_client: Optional[openai.AsyncOpenAI] = None
+
+def get_async_openai_client() -> openai.AsyncOpenAI:
+    global async_openai_client
+    if async_openai_client is None:
+        async_openai_client = openai.AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    return async_openai_client
+
+def answer_cache_key(request: ChatRequest):
+    content_hash = lab_manager.versions[request.skill][request.lab_id]["content_hash"]
+    return AnswerCache.key(request.skill, request.lab_id, content_hash, request.question)
+
+async def answer_when_shed(request: ChatRequest, started: float) -> Optional[ChatResponse]:
+    """Serve a recent answer to the same question when upstream load is being shed"""
+    cached = answer_cache.get(answer_cache_key(request))
+    if cached is None:
+        return None
+    
+    await transcript_log.record(
+        skill=request.skill,
+        lab_id=request.lab_id,
+        question=request.question,
+        response=cached,
+        relevant=True,
+        model="cache",
+        latency_ms=(time.perf_counter() - started) * 1000
+    )
+    return ChatResponse(
+        response=cached,
+        relevant=True,
+        sources=["Cached answer"]
+    )
+
+@app.post("/chat", response_model=ChatResponse)
+async def chat_with_ai(request: ChatRequest):
+    """RAG-powered chatbot endpoint"""
+    started = time.perf_counter()
+    try:
+        # Get relevant content using simplified RAG
+        with span("retrieval"):
+            context = lab_manager.get_relevant_content(request.question, request.skill, request.lab_id)
         
-        ai_response = response.choices[0].message.content
+        with span("local_answer"):
+            local_answer = await answer_locally(request, context, started)
+        if local_answer:
+            return local_answer
         
-        return ChatResponse(
+        with span("prompt"):
+            route = route_question(request)
+            system_prompt = build_system_prompt(context)
+        
+        # Call OpenAI API with the model tier picked for this question, if an upstream slot is free
+        try:
+            async with chat_admission.admit():
+                with span("upstream"):
+                    response = await get_async_openai_client().chat.completions.create(
+                        model=route["model"],
+                        messages=[
+                            {"role": "system", "content": system_prompt},
+                            {"role": "user", "content": request.question}
+                        ],
+                        max_tokens=route["max_tokens"],
+                        temperature=route["temperature"]
+                    )
+        except Overloaded as overloaded:
+            cached_answer = await answer_when_shed(request, started)
+            if cached_answer:
+                return cached_answer
+            raise HTTPException(
+                status_code=503,
+                detail="The AI tutor is busy right now. Please try again shortly.",
+                headers={"Retry-After": str(overloaded.retry_after)}
+            )
+        
+        ai_response = response.choices[0].message.content
+        answer_cache.put(answer_cache_key(request), ai_response)
+        usage = getattr(response, "usage", None)
+        await transcript_log.record(
+            skill=request.skill,
+            lab_id=request.lab_id,
+            question=request.question,
             response=ai_response,
             relevant=True,
-            sources=sources
+            model=route["model"],
+            prompt_tokens=getattr(usage, "prompt_tokens", None),
+            completion_tokens=getattr(usage, "completion_tokens", None),
+            latency_ms=(time.perf_counter() - started) * 1000,
+            route_tier=route["tier"],
+            route_score=route["score"]
         )
         
+        # Serialized here rather than by FastAPI after the handler, so the span covers it
+        with span("response"):
+            response = ChatResponse(
+                response=ai_response,
+                relevant=True,
+                sources=get_sources(request)
+            )
+            return orjson_response(response.model_dump())
+        
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing request: {str(e)}")
 
+async def stream_answer(websocket: WebSocket, message_id: str, request: ChatRequest):
+    """Answer one WebSocket question, pushing progress events and answer tokens as they arrive"""
+    started = time.perf_counter()
+    await websocket.send_json({"type": "typing", "id": message_id})
+    
+    context = lab_manager.get_relevant_content(request.question, request.skill, request.lab_id)
+    local_answer = await answer_locally(request, context, started)
+    if local_answer:
+        await websocket.send_json({
+            "type": "done",
+            "id": message_id,
+            "response": local_answer.response,
+            "relevant": local_answer.relevant,
+            "sources": local_answer.sources
+        })
+        return
+    
+    await websocket.send_json({"type": "progress", "id": message_id, "stage": "generating"})
+    route = route_question(request)
+    tokens = []
+    usage = None
+    try:
+        async with chat_admission.admit():
+            stream = await get_async_openai_client().chat.completions.create(
+                model=route["model"],
+                messages=[
+                    {"role": "system", "content": build_system_prompt(context)},
+                    {"role": "user", "content": request.question}
+                ],
+                max_tokens=route["max_tokens"],
+                temperature=route["temperature"],
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+            try:
+                async for chunk in stream:
+                    usage = chunk.usage or usage
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        tokens.append(chunk.choices[0].delta.content)
+                        await websocket.send_json({"type": "token", "id": message_id, "text": chunk.choices[0].delta.content})
+            finally:
+                # Closing the stream drops the upstream HTTP response, so a cancelled answer stops generating
+                await stream.close()
+    except Overloaded as overloaded:
+        cached_answer = await answer_when_shed(request, started)
+        if cached_answer:
+            await websocket.send_json({
+                "type": "done",
+                "id": message_id,
+                "response": cached_answer.response,
+                "relevant": True,
+                "sources": cached_answer.sources
+            })
+        else:
+            await websocket.send_json({
+                "type": "error",
+                "id": message_id,
+                "detail": "The AI tutor is busy right now. Please try again shortly.",
+                "retry_after": overloaded.retry_after
+            })
+        return
+    
+    ai_response = "".join(tokens)
+    answer_cache.put(answer_cache_key(request), ai_response)
+    await transcript_log.record(
+        skill=request.skill,
+        lab_id=request.lab_id,
+        question=request.question,
+        response=ai_response,
+        relevant=True,
+        model=route["model"],
+        prompt_tokens=getattr(usage, "prompt_tokens", None),
+        completion_tokens=getattr(usage, "completion_tokens", None),
+        latency_ms=(time.perf_counter() - started) * 1000,
+        route_tier=route["tier"],
+        route_score=route["score"]
+    )
+    await websocket.send_json({
+        "type": "done",
+        "id": message_id,
+        "response": ai_response,
+        "relevant": True,
+        "sources": get_sources(request)
+    })
+
+@app.websocket("/ws/chat")
+async def chat_websocket(websocket: WebSocket, skill: str, lab_id: str):
+    """Persistent chat channel for one lab session.
+
+    Client messages: {"type": "question", "id", "question"} and {"type": "cancel", "id"}.
+    Server events: typing, progress, token, done, cancelled and error, each tagged with the question id.
+    """
+    await websocket.accept()
+    in_flight: Dict[str, asyncio.Task] = {}
+    
+    async def answer(message_id: str, request: ChatRequest):
+        try:
+            await stream_answer(websocket, message_id, request)
+        except asyncio.CancelledError:
+            event = {"type": "cancelled", "id": message_id}
+        except Exception as e:
+            event = {"type": "error", "id": message_id, "detail": f"Error processing request: {str(e)}"}
+        else:
+            return
+        finally:
+            if in_flight.get(message_id) is asyncio.current_task():
+                del in_flight[message_id]
+        
+        # The socket may already be gone if the cancel came from a disconnect
+        try:
+            await websocket.send_json(event)
+        except Exception:
+            pass
+    
+    try:
+        while True:
+            # A malformed frame is answered with an error event; it must not end the session
+            try:
+                message = json.loads(await websocket.receive_text())
+            except (ValueError, KeyError):
+                # KeyError: a binary frame has no text
+                message = None
+            if not isinstance(message, dict):
+                await websocket.send_json({"type": "error", "id": "", "detail": "Messages must be JSON objects"})
+                continue
+            message_id = str(message.get("id", ""))
+            
+            if message.get("type") == "question":
+                question = message.get("question")
+                if not isinstance(question, str) or not question.strip():
+                    await websocket.send_json({"type": "error", "id": message_id, "detail": "Question must be a non-empty string"})
+                    continue
+                try:
+                    request = ChatRequest(question=question, lab_id=lab_id, skill=skill)
+                except ValueError as e:
+                    await websocket.send_json({"type": "error", "id": message_id, "detail": f"Invalid question: {e}"})
+                    continue
+                if message_id in in_flight:
+                    in_flight[message_id].cancel()
+                in_flight[message_id] = asyncio.create_task(answer(message_id, request))
+            elif message.get("type") == "cancel" and message_id in in_flight:
+                in_flight[message_id].cancel()
+            else:
+                await websocket.send_json({"type": "error", "id": message_id, "detail": "Unsupported message"})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        for task in list(in_flight.values()):
+            task.cancel()
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
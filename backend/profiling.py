@@ -0,0 +1,214 @@
+import asyncio
+import hmac
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+logger = logging.getLogger("codesafari.profiling")
+
+_current_trace: ContextVar[Optional["RequestTrace"]] = ContextVar("current_trace", default=None)
+
+
+class RequestTrace:
+    """Stage spans for one request, plus folded stack samples when it is being profiled"""
+
+    def __init__(self, sampled: bool):
+        self.sampled = sampled
+        self.started = time.perf_counter()
+        self.spans: List[Dict] = []
+        self.stacks: Dict[str, int] = {}
+
+
+@contextmanager
+def span(name: str):
+    """Time a stage of the current request; a no-op outside a traced request"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        trace.spans.append({
+            "name": name,
+            "start_ms": round((start - trace.started) * 1000, 3),
+            "duration_ms": round((end - start) * 1000, 3)
+        })
+
+
+# Samples taken while the loop was idle or running another request's code
+OTHER_WORK_STACK = "(idle or other requests)"
+
+
+def fold_stack(frame, root=None) -> Optional[str]:
+    """Render a frame chain root-first in the collapsed format flamegraph tools read.
+
+    With `root`, only frames from `root` inward are kept, and None is returned when the
+    stack does not pass through `root` at all.
+    """
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        if frame is root:
+            break
+        frame = frame.f_back
+    else:
+        if root is not None:
+            return None
+    return ";".join(reversed(names))
+
+
+class StackSampler(threading.Thread):
+    """Periodically sample the event-loop thread, attributing only stacks inside one request.
+
+    The loop interleaves every in-flight request, so a sample counts for this request only
+    when its stack passes through the request's own middleware frame (`root`).
+    """
+
+    def __init__(self, thread_id: int, root, trace: RequestTrace, interval: float):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.root = root
+        self.trace = trace
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = fold_stack(frame, self.root) or OTHER_WORK_STACK
+            self.trace.stacks[stack] = self.trace.stacks.get(stack, 0) + 1
+
+    def stop(self) -> None:
+        # Called on the event loop, so never join; the thread exits at its next wake-up
+        self.stopped.set()
+
+
+class RequestProfiler:
+    """Opt-in sampling profiler and slow-request tracer for the HTTP request path (ASGI middleware).
+
+    A request is profiled when its trigger header carries the shared `token` or it is picked
+    by the sample rate; its folded stacks are written to `output_dir` for flamegraph tools,
+    keeping only the newest `max_profiles` files. Every request records stage spans, which
+    are logged when it is slower than `slow_ms`.
+    """
+
+    def __init__(self, app, sample_rate: float = 0.0, slow_ms: float = 2000, output_dir: str = "profiles",
+                 token: Optional[str] = None, max_profiles: int = 100, interval: float = 0.005,
+                 header: str = "x-profile"):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.output_dir = output_dir
+        self.token = token.encode() if token else None
+        self.max_profiles = max_profiles
+        self.interval = interval
+        self.header = header.encode()
+
+    @staticmethod
+    def settings_from_env() -> Dict:
+        return {
+            "sample_rate": float(os.getenv("PROFILE_SAMPLE_RATE", "0")),
+            "slow_ms": float(os.getenv("SLOW_REQUEST_MS", "2000")),
+            "output_dir": os.getenv("PROFILE_DIR", "profiles"),
+            "token": os.getenv("PROFILE_TOKEN"),
+            "max_profiles": int(os.getenv("PROFILE_MAX_FILES", "100"))
+        }
+
+    def should_sample(self, headers: Dict[bytes, bytes]) -> bool:
+        # The header only works with the shared token, so anonymous clients cannot start samplers
+        if self.token is not None and hmac.compare_digest(headers.get(self.header, b""), self.token):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def write_profile(self, profile_id: str, trace: RequestTrace) -> str:
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, f"{profile_id}.folded")
+        # The sampler may still record one last stack after stop(), so write a snapshot
+        stacks = list(trace.stacks.items())
+        with open(path, "w", encoding="utf-8") as output:
+            output.writelines(f"{stack} {count}\n" for stack, count in stacks)
+        self.prune_profiles()
+        return path
+
+    def prune_profiles(self) -> None:
+        """Delete the oldest profiles beyond `max_profiles`"""
+        profiles = []
+        for name in os.listdir(self.output_dir):
+            if name.endswith(".folded"):
+                path = os.path.join(self.output_dir, name)
+                try:
+                    profiles.append((os.stat(path).st_mtime_ns, path))
+                except FileNotFoundError:
+                    continue
+        profiles.sort()
+        for _, path in profiles[:max(0, len(profiles) - self.max_profiles)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = RequestTrace(self.should_sample(dict(scope.get("headers", []))))
+        profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}" if trace.sampled else None
+        status = None
+        total_ms = None
+
+        async def send_with_timing(message):
+            nonlocal status, total_ms
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                total_ms = (time.perf_counter() - trace.started) * 1000
+                if trace.sampled or total_ms >= self.slow_ms:
+                    server_timing = ", ".join(
+                        [f"{item['name']};dur={item['duration_ms']}" for item in trace.spans] + [f"total;dur={total_ms:.3f}"]
+                    )
+                    headers = list(message.get("headers", [])) + [(b"server-timing", server_timing.encode())]
+                    if profile_id:
+                        headers.append((b"x-profile-id", profile_id.encode()))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        token = _current_trace.set(trace)
+        sampler = None
+        if trace.sampled:
+            # This coroutine's frame is on the stack whenever the loop runs this request's code
+            sampler = StackSampler(threading.get_ident(), sys._getframe(), trace, self.interval)
+            sampler.start()
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            if sampler is not None:
+                sampler.stop()
+            _current_trace.reset(token)
+
+        if trace.sampled:
+            await asyncio.get_running_loop().run_in_executor(None, self.write_profile, profile_id, trace)
+        if total_ms is not None and total_ms >= self.slow_ms:
+            logger.warning("slow request %s", json.dumps({
+                "profile_id": profile_id,
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": status,
+                "total_ms": round(total_ms, 3),
+                "spans": trace.spans
+            }))
@@ -0,0 +1,89 @@
+import json
+import logging
+import os
+import re
+from typing import Dict, Optional
+
+logger = logging.getLogger("codesafari.routing")
+
+CODE_PATTERN = re.compile(r"```|\bdef \w+\(|\bfunction\b|=>|\breturn\b|[;{}]\s*$|^\s{4,}\S", re.MULTILINE)
+DEBUG_PATTERN = re.compile(
+    r"\b(?:debug|error|exception|traceback|bug|fix|wrong|fails?|failing|broken|crash(?:es)?|"
+    r"doesn'?t work|not working|infinite|stuck)\b"
+)
+DIFFICULTY_LEVELS = {"Beginner": 0, "Intermediate": 1, "Advanced": 2}
+
+# Tiers are ordered cheapest first; a question goes to the first tier whose max_score covers it
+DEFAULT_ROUTING_POLICY = {
+    "tiers": [
+        {"name": "light", "model": "gpt-4o-mini", "max_tokens": 200, "temperature": 0.3, "max_score": 1},
+        {"name": "standard", "model": "gpt-4o", "max_tokens": 300, "temperature": 0.5, "max_score": 3},
+        {"name": "heavy", "model": "gpt-4", "max_tokens": 400, "temperature": 0.7, "max_score": None}
+    ],
+    "long_question_words": 40,
+    "difficulty_weight": 1,
+    "low_confidence": 0.7
+}
+SKILL_ROUTING_POLICIES = {
+    # Advanced JavaScript labs (React) lean on framework knowledge, so weigh difficulty more
+    "javascript": {"difficulty_weight": 1.5}
+}
+
+
+class ModelRouter:
+    """Pick a model tier and output budget for a question from cheap local signals"""
+
+    def __init__(self, overrides: Optional[Dict] = None):
+        # Overrides are merged per skill, so overriding one skill keeps the others' built-in settings
+        self.policies = {skill: dict(policy) for skill, policy in SKILL_ROUTING_POLICIES.items()}
+        for skill, policy in (overrides or {}).items():
+            self.policies.setdefault(skill, {}).update(policy)
+
+    @classmethod
+    def from_env(cls) -> "ModelRouter":
+        """Per-skill overrides can be supplied as JSON in MODEL_ROUTING_POLICIES"""
+        overrides = os.getenv("MODEL_ROUTING_POLICIES")
+        return cls(json.loads(overrides) if overrides else None)
+
+    def policy_for(self, skill: str) -> Dict:
+        return {**DEFAULT_ROUTING_POLICY, **self.policies.get("default", {}), **self.policies.get(skill, {})}
+
+    def route(self, question: str, skill: str, lab_id: str, difficulty: Optional[str], retrieval_confidence: float) -> Dict:
+        """Score the question's complexity and return the chosen tier with the signals behind it"""
+        policy = self.policy_for(skill)
+        words = len(question.split())
+        signals = {
+            "words": words,
+            "has_code": bool(CODE_PATTERN.search(question)),
+            "debugging": bool(DEBUG_PATTERN.search(question.lower())),
+            "difficulty": difficulty,
+            "retrieval_confidence": round(retrieval_confidence, 3)
+        }
+
+        score = 0.0
+        if words > policy["long_question_words"]:
+            score += 1
+        if words > 2 * policy["long_question_words"]:
+            score += 1
+        if signals["has_code"]:
+            score += 2
+        if signals["debugging"]:
+            score += 1
+        score += DIFFICULTY_LEVELS.get(difficulty, 1) * policy["difficulty_weight"]
+        if retrieval_confidence < policy["low_confidence"]:
+            score += 1
+
+        tier = next(
+            (tier for tier in policy["tiers"] if tier["max_score"] is None or score <= tier["max_score"]),
+            policy["tiers"][-1]
+        )
+        decision = {
+            "tier": tier["name"],
+            "model": tier["model"],
+            "max_tokens": tier["max_tokens"],
+            "temperature": tier["temperature"],
+            "score": score,
+            "signals": signals
+        }
+        logger.info("route skill=%s lab=%s %s", skill, lab_id, json.dumps(decision))
+        return decision
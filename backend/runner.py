@@ -0,0 +1,429 @@
+import asyncio
+import ctypes
+import io
+import json
+import logging
+import os
+import pwd
+import resource
+import select
+import signal
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from typing import Dict, List, Optional
+
+logger = logging.getLogger("codesafari.runner")
+
+# Modules loaded by the worker up front, since submissions run in an empty root directory
+PRELOADED_MODULES = (
+    "bisect", "collections", "copy", "dataclasses", "functools", "heapq", "itertools",
+    "math", "operator", "random", "re", "statistics", "string", "typing"
+)
+MAX_CODE_CHARS = 100_000
+MAX_OUTPUT_BYTES = 64 * 1024
+MAX_FRAME_BYTES = 1024 * 1024
+MAX_STDOUT_CHARS = 4000
+MAX_OPEN_FILES = 32
+
+# Namespaces each worker enters before running anything: its own mounts, network (no
+# interfaces but a down loopback), PIDs (nothing outside is visible or signalable) and SysV IPC
+CLONE_NEWNS = 0x00020000
+CLONE_NEWIPC = 0x08000000
+CLONE_NEWUSER = 0x10000000
+CLONE_NEWPID = 0x20000000
+CLONE_NEWNET = 0x40000000
+MS_RDONLY, MS_NOSUID, MS_NODEV, MS_NOEXEC = 1, 2, 4, 8
+MS_REC = 0x4000
+MS_PRIVATE = 0x40000
+MNT_DETACH = 2
+PR_SET_DUMPABLE = 4
+PR_SET_NO_NEW_PRIVS = 38
+LINUX_CAPABILITY_VERSION_3 = 0x20080522
+
+_libc = ctypes.CDLL(None, use_errno=True)
+
+
+class _CapHeader(ctypes.Structure):
+    _fields_ = [("version", ctypes.c_uint32), ("pid", ctypes.c_int)]
+
+
+class _CapData(ctypes.Structure):
+    _fields_ = [("effective", ctypes.c_uint32), ("permitted", ctypes.c_uint32), ("inheritable", ctypes.c_uint32)]
+
+
+def _check(result: int, call: str) -> None:
+    if result != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, f"{call}: {os.strerror(errno)}")
+
+
+def _write_frame(fd: int, message: Dict) -> None:
+    """Send one length-prefixed JSON message; pickle never crosses a sandbox boundary"""
+    body = json.dumps(message, default=repr).encode()
+    payload = struct.pack("!I", len(body)) + body
+    while payload:
+        payload = payload[os.write(fd, payload):]
+
+
+def _read_exact(fd: int, size: int, deadline: Optional[float]) -> Optional[bytes]:
+    chunks = []
+    while size > 0:
+        remaining = None if deadline is None else deadline - time.monotonic()
+        if remaining is not None and remaining <= 0:
+            return None
+        ready, _, _ = select.select([fd], [], [], remaining)
+        if not ready:
+            continue
+        chunk = os.read(fd, min(size, 65536))
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def _read_frame(fd: int, deadline: Optional[float] = None, max_bytes: int = MAX_FRAME_BYTES) -> Optional[Dict]:
+    """Read one length-prefixed JSON object, or None on EOF, timeout, oversize or garbage"""
+    header = _read_exact(fd, 4, deadline)
+    if header is None:
+        return None
+    size = struct.unpack("!I", header)[0]
+    if size > max_bytes:
+        return None
+    body = _read_exact(fd, size, deadline)
+    if body is None:
+        return None
+    try:
+        message = json.loads(body)
+    except ValueError:
+        return None
+    return message if isinstance(message, dict) else None
+
+
+def _normalize(value):
+    """Convert a result to plain JSON types so tuples compare equal to lists"""
+    return json.loads(json.dumps(value, default=repr))
+
+
+def _execute(code: str, calls: List[str]) -> Dict:
+    """Run a submission and evaluate each test call, reporting only the raw outcomes"""
+    namespace = {"__name__": "__exercise__"}
+    stdout = io.StringIO()
+    results = []
+
+    with redirect_stdout(stdout):
+        try:
+            exec(compile(code, "<submission>", "exec"), namespace)
+        except BaseException as e:
+            return {"error": f"{type(e).__name__}: {e}", "results": [], "stdout": stdout.getvalue()[:MAX_STDOUT_CHARS]}
+
+        for call in calls:
+            try:
+                results.append({"actual": _normalize(eval(call, namespace))})
+            except BaseException as e:
+                results.append({"error": f"{type(e).__name__}: {e}"})
+
+    return {"error": None, "results": results, "stdout": stdout.getvalue()[:MAX_STDOUT_CHARS]}
+
+
+def _grade(outcome, cases: List[Dict]) -> Dict:
+    """Rebuild the untrusted outcome from a submission against the worker's own copy of the cases"""
+    if not isinstance(outcome, dict):
+        return {"error": "Submission terminated without producing results", "results": []}
+
+    error = outcome.get("error")
+    stdout = outcome.get("stdout")
+    raw_results = outcome.get("results") if isinstance(outcome.get("results"), list) else []
+    results = []
+    for case, raw in zip(cases, raw_results):
+        expected = _normalize(case["expected"])
+        if isinstance(raw, dict) and "actual" in raw:
+            results.append({"call": case["call"], "expected": expected, "actual": raw["actual"], "passed": raw["actual"] == expected})
+        else:
+            detail = raw.get("error") if isinstance(raw, dict) else None
+            results.append({"call": case["call"], "expected": expected, "error": str(detail)[:MAX_STDOUT_CHARS], "passed": False})
+
+    return {
+        "error": None if error is None else str(error)[:MAX_STDOUT_CHARS],
+        "results": results if error is None else [],
+        "stdout": stdout[:MAX_STDOUT_CHARS] if isinstance(stdout, str) else ""
+    }
+
+
+def _enter_namespaces(rootless: bool, jail: str) -> None:
+    """Move the worker into fresh namespaces (plus a user namespace when rootless) and seal the jail.
+
+    The jail becomes an empty read-only tmpfs, so a submission cannot leave files behind for
+    the next one even where it owns the directory underneath.
+    """
+    flags = CLONE_NEWNS | CLONE_NEWNET | CLONE_NEWPID | CLONE_NEWIPC | (CLONE_NEWUSER if rootless else 0)
+    _check(_libc.unshare(flags), "unshare")
+    _check(_libc.mount(b"none", b"/", None, MS_REC | MS_PRIVATE, None), "mount")
+    _check(
+        _libc.mount(b"tmpfs", jail.encode(), b"tmpfs", MS_RDONLY | MS_NOSUID | MS_NODEV | MS_NOEXEC, b"size=4k,mode=555"),
+        "mount"
+    )
+
+
+def _drop_privileges(jail: str, sandbox_user: Optional[pwd.struct_passwd]) -> None:
+    """Confine the submission process to an empty root and strip every capability and uid it holds"""
+    os.chroot(jail)
+    os.chdir("/")
+    if sandbox_user is not None:
+        os.setgroups([])
+        os.setgid(sandbox_user.pw_gid)
+        os.setuid(sandbox_user.pw_uid)
+    else:
+        # Rootless: the user namespace granted capabilities that must not reach student code
+        header = _CapHeader(LINUX_CAPABILITY_VERSION_3, 0)
+        data = (_CapData * 2)()
+        _check(_libc.capset(ctypes.byref(header), data), "capset")
+    _check(_libc.prctl(PR_SET_NO_NEW_PRIVS, 1, 0, 0, 0), "prctl")
+
+
+def _limit_resources(cpu_seconds: int, memory_bytes: int) -> None:
+    """Apply rlimits to the submission process before any student code runs"""
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 1))
+    resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+    resource.setrlimit(resource.RLIMIT_FSIZE, (0, 0))
+    resource.setrlimit(resource.RLIMIT_NPROC, (0, 0))
+    resource.setrlimit(resource.RLIMIT_NOFILE, (MAX_OPEN_FILES, MAX_OPEN_FILES))
+    resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+
+
+def _run_isolated(job: Dict, settings: Dict, jail: str, sandbox_user: Optional[pwd.struct_passwd]) -> Dict:
+    """Fork a throwaway child from the warm worker so each submission starts clean"""
+    cases = job["cases"]
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+
+    if pid == 0:
+        try:
+            # The result pipe becomes fd 3 and is the only descriptor student code can reach
+            null_fd = os.open(os.devnull, os.O_RDWR)
+            for fd in (0, 1, 2):
+                os.dup2(null_fd, fd)
+            os.dup2(write_fd, 3)
+            os.closerange(4, resource.getrlimit(resource.RLIMIT_NOFILE)[0])
+            _drop_privileges(jail, sandbox_user)
+            _limit_resources(settings["cpu_seconds"], settings["memory_bytes"])
+            outcome = _execute(job["code"], [case["call"] for case in cases])
+        except BaseException as e:
+            outcome = {"error": f"{type(e).__name__}: {e}", "results": []}
+        try:
+            payload = json.dumps(outcome, default=repr).encode()
+            if len(payload) > MAX_OUTPUT_BYTES:
+                payload = json.dumps({"error": "Submission output too large", "results": []}).encode()
+            while payload:
+                payload = payload[os.write(3, payload):]
+        finally:
+            os._exit(0)
+
+    os.close(write_fd)
+    chunks = []
+    received = 0
+    deadline = time.monotonic() + settings["timeout"]
+    timed_out = False
+
+    while received <= MAX_OUTPUT_BYTES:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            timed_out = True
+            break
+        ready, _, _ = select.select([read_fd], [], [], remaining)
+        if not ready:
+            continue
+        chunk = os.read(read_fd, 65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        received += len(chunk)
+
+    os.close(read_fd)
+    if timed_out or received > MAX_OUTPUT_BYTES:
+        os.kill(pid, signal.SIGKILL)
+    _, status = os.waitpid(pid, 0)
+
+    if timed_out or os.WIFSIGNALED(status) and os.WTERMSIG(status) in (signal.SIGXCPU, signal.SIGKILL):
+        return {"error": f"Time limit exceeded ({settings['timeout']:g}s)", "results": []}
+    if received > MAX_OUTPUT_BYTES:
+        return {"error": "Submission output too large", "results": []}
+
+    try:
+        outcome = json.loads(b"".join(chunks))
+    except ValueError:
+        outcome = None
+    return _grade(outcome, cases)
+
+
+def _serve(settings: Dict, jail: str, sandbox_user: Optional[pwd.struct_passwd]) -> None:
+    """Job loop of the worker's PID-namespace init: one frame in, one fresh fork, one frame out"""
+    # Non-dumpable, so submissions sharing our uid in rootless mode cannot ptrace us
+    _check(_libc.prctl(PR_SET_DUMPABLE, 0, 0, 0, 0), "prctl")
+    _write_frame(1, {"ready": True})
+
+    while True:
+        job = _read_frame(0)
+        if job is None:
+            break
+        if not isinstance(job.get("code"), str) or not isinstance(job.get("cases"), list):
+            _write_frame(1, {"error": "Malformed exercise job", "results": []})
+            continue
+        _write_frame(1, _run_isolated(job, settings, jail, sandbox_user))
+
+
+def _worker_main(settings: Dict) -> None:
+    """Entry point of a worker interpreter started by ExerciseRunner with an empty environment"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    os.environ.clear()
+    for module in PRELOADED_MODULES:
+        __import__(module)
+
+    # Created before entering a user namespace, where our unmapped uid cannot create files
+    jail = tempfile.mkdtemp(prefix="exercise-root-")
+    try:
+        rootless = os.geteuid() != 0
+        sandbox_user = None if rootless else pwd.getpwnam(settings["sandbox_user"])
+        _enter_namespaces(rootless, jail)
+        # The first child in the new PID namespace is its init and runs the job loop
+        pid = os.fork()
+    except (OSError, KeyError) as e:
+        os.rmdir(jail)
+        _write_frame(1, {"ready": False, "error": f"{type(e).__name__}: {e}"})
+        os._exit(1)
+
+    if pid == 0:
+        try:
+            _serve(settings, jail, sandbox_user)
+        finally:
+            os._exit(0)
+    _, status = os.waitpid(pid, 0)
+    _libc.umount2(jail.encode(), MNT_DETACH)
+    os.rmdir(jail)
+    os._exit(os.waitstatus_to_exitcode(status))
+
+
+class ExerciseRunner:
+    """Pool of pre-started, namespace-isolated Python workers for exercise submissions.
+
+    Workers are fresh `python -I` interpreters with an empty environment, so they never hold
+    the API server's secrets, and talk to it only in length-checked JSON over their stdio.
+    Each submission runs in a forked child confined to an empty chroot inside the worker's
+    network and PID namespaces, without capabilities (or as `sandbox_user` when started as
+    root), with rlimits applied and every descriptor but its result pipe closed.
+    """
+
+    def __init__(self, size: int = 4, timeout: float = 5.0, memory_mb: int = 256, sandbox_user: str = "nobody"):
+        self.size = size
+        self.timeout = timeout
+        self.settings = {
+            "timeout": timeout,
+            "cpu_seconds": max(1, int(timeout)),
+            "memory_bytes": memory_mb * 1024 * 1024,
+            "sandbox_user": sandbox_user
+        }
+        self.unavailable: Optional[str] = None
+        self._idle: Optional[asyncio.Queue] = None
+        self._workers: List[subprocess.Popen] = []
+        self._jobs = set()
+
+    def _start_worker(self) -> subprocess.Popen:
+        process = subprocess.Popen(
+            [sys.executable, "-I", os.path.abspath(__file__), json.dumps(self.settings)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            env={},
+            cwd="/",
+            start_new_session=True
+        )
+        self._workers.append(process)
+        ready = _read_frame(process.stdout.fileno(), time.monotonic() + 10)
+        if not ready or not ready.get("ready"):
+            self._stop_worker(process)
+            raise RuntimeError((ready or {}).get("error") or "worker did not start")
+        return process
+
+    def _stop_worker(self, process: subprocess.Popen) -> None:
+        try:
+            process.stdin.close()
+        except OSError:
+            pass
+        try:
+            process.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+        if process in self._workers:
+            self._workers.remove(process)
+
+    async def start(self) -> None:
+        self._idle = asyncio.Queue()
+        loop = asyncio.get_running_loop()
+        try:
+            for _ in range(self.size):
+                self._idle.put_nowait(await loop.run_in_executor(None, self._start_worker))
+        except RuntimeError as e:
+            # Fail closed: without isolation no submission is run at all
+            self.unavailable = str(e)
+            logger.error("exercise sandbox unavailable: %s", e)
+            await self.stop()
+
+    async def stop(self) -> None:
+        for process in list(self._workers):
+            self._stop_worker(process)
+
+    def _roundtrip(self, process: subprocess.Popen, job: Dict) -> Optional[Dict]:
+        _write_frame(process.stdin.fileno(), job)
+        # The worker enforces the per-submission timeout itself; the grace period
+        # only catches a worker that has hung or died
+        return _read_frame(process.stdout.fileno(), time.monotonic() + self.timeout + 2)
+
+    async def run(self, code: str, cases: List[Dict]) -> Dict:
+        """Run a submission on the next idle worker and return its test results"""
+        if self.unavailable is not None:
+            return {"error": "Exercise sandbox is unavailable", "results": [], "duration_ms": 0.0}
+        if self._idle is None:
+            raise RuntimeError("Exercise runner has not been started")
+        if len(code) > MAX_CODE_CHARS:
+            return {"error": f"Submission is longer than {MAX_CODE_CHARS} characters", "results": [], "duration_ms": 0.0}
+
+        process = await self._idle.get()
+        started = time.perf_counter()
+        # Shielded so a cancelled request still lets the job finish and the worker return to the pool
+        job = asyncio.ensure_future(self._run_on(process, {"code": code, "cases": cases}))
+        self._jobs.add(job)
+        job.add_done_callback(self._jobs.discard)
+        outcome = await asyncio.shield(job)
+
+        outcome["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return outcome
+
+    async def _run_on(self, process: subprocess.Popen, job: Dict) -> Dict:
+        """Run one job on a checked-out worker, always handing a live worker back to the pool"""
+        loop = asyncio.get_running_loop()
+        try:
+            try:
+                outcome = await loop.run_in_executor(None, self._roundtrip, process, job)
+            except OSError:
+                outcome = None
+            if outcome is None:
+                crashed, process = process, None
+                await loop.run_in_executor(None, self._stop_worker, crashed)
+                outcome = {"error": "Exercise worker crashed, please try again", "results": []}
+                try:
+                    process = await loop.run_in_executor(None, self._start_worker)
+                except RuntimeError as e:
+                    self.unavailable = str(e)
+                    logger.error("exercise sandbox unavailable: %s", e)
+        finally:
+            if process is not None:
+                self._idle.put_nowait(process)
+        return outcome
+
+if __name__ == "__main__":
+    _worker_main(json.loads(sys.argv[1]))
@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+
+from admission import AdmissionController, AnswerCache, Overloaded
+
+
+async def hold(controller, release):
+    async with controller.admit():
+        await release.wait()
+
+
+def test_full_waiting_line_is_shed_up_front():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_waiting=1, max_wait=5.0)
+        release = asyncio.Event()
+        holder = asyncio.create_task(hold(controller, release))
+        waiter = asyncio.create_task(hold(controller, release))
+        await asyncio.sleep(0)
+        assert controller.stats()["in_flight"] == 1 and controller.stats()["waiting"] == 1
+
+        with pytest.raises(Overloaded) as shed:
+            async with controller.admit():
+                pass
+        assert shed.value.retry_after >= 1
+        assert controller.stats()["shed"] == 1
+
+        release.set()
+        await asyncio.gather(holder, waiter)
+
+    asyncio.run(scenario())
+
+
+def test_burst_within_free_slots_is_admitted():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=2, max_waiting=1)
+        release = asyncio.Event()
+        holders = [asyncio.create_task(hold(controller, release)) for _ in range(2)]
+        await asyncio.sleep(0)
+        stats = controller.stats()
+
+        release.set()
+        await asyncio.gather(*holders, return_exceptions=True)
+        assert stats["in_flight"] == 2 and stats["shed"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_long_estimated_wait_is_shed_up_front():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_waiting=8, max_wait=1.0)
+        controller.upstream_seconds = 3.0
+        release = asyncio.Event()
+        holder = asyncio.create_task(hold(controller, release))
+        await asyncio.sleep(0)
+
+        with pytest.raises(Overloaded) as shed:
+            async with controller.admit():
+                pass
+        assert shed.value.retry_after == 3
+        assert controller.waiting == 0
+
+        release.set()
+        await holder
+
+    asyncio.run(scenario())
+
+
+def test_wait_past_max_wait_is_shed():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_wait=0.05)
+        release = asyncio.Event()
+        holder = asyncio.create_task(hold(controller, release))
+        await asyncio.sleep(0)
+
+        with pytest.raises(Overloaded):
+            async with controller.admit():
+                pass
+        assert controller.stats()["waiting"] == 0 and controller.stats()["shed"] == 1
+
+        release.set()
+        await holder
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_requests_release_their_slot_and_place_in_line():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_wait=5.0)
+        holder = asyncio.create_task(hold(controller, asyncio.Event()))
+        waiter = asyncio.create_task(hold(controller, asyncio.Event()))
+        await asyncio.sleep(0)
+        assert controller.in_flight == 1 and controller.waiting == 1
+
+        for task in (waiter, holder):
+            task.cancel()
+        await asyncio.gather(holder, waiter, return_exceptions=True)
+        assert controller.in_flight == 0 and controller.waiting == 0
+
+        # The slot is free again, so the next request is admitted immediately
+        async with controller.admit():
+            assert controller.in_flight == 1
+
+    asyncio.run(scenario())
+
+
+def test_answer_cache_normalizes_questions_and_evicts_the_oldest():
+    cache = AnswerCache(max_entries=2)
+    cache.put(AnswerCache.key("python", "python-basics", "h1", "What is a list?"), "first")
+    assert cache.get(AnswerCache.key("python", "python-basics", "h1", "  what is   a LIST ")) == "first"
+    assert cache.get(AnswerCache.key("python", "python-basics", "h2", "What is a list?")) is None
+
+    cache.put(AnswerCache.key("python", "python-basics", "h1", "What is a dict?"), "second")
+    cache.get(AnswerCache.key("python", "python-basics", "h1", "What is a list?"))
+    cache.put(AnswerCache.key("python", "python-basics", "h1", "What is a set?"), "third")
+    assert cache.get(AnswerCache.key("python", "python-basics", "h1", "What is a dict?")) is None
+    assert cache.get(AnswerCache.key("python", "python-basics", "h1", "What is a list?")) == "first"
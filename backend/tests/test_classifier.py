@@ -0,0 +1,34 @@
+import pytest
+
+from classifier import OFF_TOPIC_EXAMPLES, RelevanceClassifier, tokenize
+
+
+def test_tokenize_drops_question_words_and_adds_bigrams():
+    assert tokenize("What is a list comprehension?") == ["list", "comprehension", "list comprehension"]
+
+
+def test_classifier_separates_lab_questions_from_off_topic_ones():
+    classifier = RelevanceClassifier().fit(
+        ["How do I append to a list?", "Why does my recursive function overflow the stack?",
+         "What does a dictionary comprehension return?", "How do I sort a list of tuples by key?"],
+        OFF_TOPIC_EXAMPLES
+    )
+
+    assert classifier.is_relevant("How do I append items to a list?")
+    assert not classifier.is_relevant("Who won the football game?")
+    # No shared vocabulary at all is no evidence of being on topic
+    assert classifier.predict_proba("zxq plorb") == 0.0
+
+
+def test_lab_manager_rejects_and_answers_locally():
+    for dependency in ("fastapi", "pydantic", "openai", "dotenv", "uvicorn"):
+        pytest.importorskip(dependency)
+    import main
+
+    manager = main.lab_manager
+    assert manager.get_relevant_content("Who is Rihanna?", "python", "python-basics") == ""
+    assert manager.answer_definition("Who is Rihanna?", "python", "python-basics") is None
+
+    definition = manager.answer_definition("what is append?", "python", "python-basics")
+    assert definition["term"] == "append(x)"
+    assert manager.relevance_classifier.is_relevant("what is append?")
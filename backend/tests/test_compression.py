@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+
+import compression
+from compression import COMPRESSION_MIN_BYTES, CompressionMiddleware, add_vary, negotiate_encoding
+
+
+@pytest.fixture
+def all_encodings(monkeypatch):
+    """Negotiate as if brotli and zstandard were both installed"""
+    monkeypatch.setattr(compression, "COMPRESSORS", {name: (bytes, bytes) for name in ("gzip", "br", "zstd")})
+
+
+@pytest.mark.parametrize("accept, expected", [
+    ("gzip, br", "br"),
+    ("gzip;q=1.0, br;q=0.5", "gzip"),
+    ("br;q=0.8, zstd;q=0.9, gzip;q=0.1", "zstd"),
+    ("gzip;q=oops, br", "br"),
+    ("*", "zstd"),
+    ("zstd;q=0, *", "br"),
+    ("*;q=0", None),
+    ("gzip;q=0", None),
+    ("identity", None),
+    ("", None),
+])
+def test_negotiate_encoding(all_encodings, accept, expected):
+    assert negotiate_encoding(accept) == expected
+
+
+def test_negotiate_skips_encodings_that_are_not_installed(monkeypatch):
+    monkeypatch.setattr(compression, "COMPRESSORS", {"gzip": (bytes, bytes)})
+    assert negotiate_encoding("br, zstd") is None
+    assert negotiate_encoding("br, *;q=0.1") == "gzip"
+
+
+def test_add_vary_merges_into_an_existing_header():
+    assert add_vary([(b"vary", b"Origin")], b"Accept-Encoding") == [(b"vary", b"Origin, Accept-Encoding")]
+    assert add_vary([(b"Vary", b"accept-encoding")], b"Accept-Encoding") == [(b"Vary", b"accept-encoding")]
+    assert add_vary([(b"content-type", b"application/json")], b"Accept-Encoding")[-1] == (b"vary", b"Accept-Encoding")
+
+
+def test_middleware_sends_a_single_vary_header():
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"vary", b"Origin")]})
+        await send({"type": "http.response.body", "body": b"x" * COMPRESSION_MIN_BYTES})
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "headers": [(b"accept-encoding", b"gzip")]}
+    asyncio.run(CompressionMiddleware(app)(scope, None, send))
+
+    vary = [value for name, value in sent[0]["headers"] if name.lower() == b"vary"]
+    assert vary == [b"Origin, Accept-Encoding"]
@@ -0,0 +1,108 @@
+import json
+
+import pytest
+
+for dependency in ("fastapi", "pydantic", "openai", "dotenv", "uvicorn"):
+    pytest.importorskip(dependency)
+
+import main
+
+
+@pytest.fixture
+def content_dir(tmp_path, monkeypatch):
+    (tmp_path / "python").mkdir()
+    monkeypatch.setattr(main, "LAB_CONTENT_DIR", str(tmp_path))
+    return tmp_path
+
+
+def write_lab(content_dir, lab_id, title):
+    lab = {**main.LabManager.load_lab_content(None)["python"]["python-basics"], "title": title}
+    (content_dir / "python" / f"{lab_id}.json").write_text(json.dumps(lab))
+
+
+def changed_ids(changes):
+    return {(change["skill"], change["lab_id"]) for change in changes["changed"]}
+
+
+def test_cursor_from_another_process_gets_the_full_set(content_dir):
+    first = main.LabManager()
+    write_lab(content_dir, "a", "Lab A")
+    first.reload_labs()
+    cursor = first.get_changes("")["cursor"]
+    (content_dir / "python" / "a.json").unlink()
+
+    # A restart from the same original content reaches the same version number
+    second = main.LabManager()
+    write_lab(content_dir, "b", "Lab B")
+    second.reload_labs()
+    assert second.version == int(cursor.split(":")[1])
+
+    changes = second.get_changes(cursor)
+    assert ("python", "b") in changed_ids(changes)
+    assert ("python", "a") not in changed_ids(changes)
+    assert len(changes["changed"]) == sum(len(labs) for labs in second.labs.values())
+
+
+def snippet_symbols(question, skill, lab_id):
+    return [block["symbols"] for block in main.lab_manager.find_code_snippets(question, skill, lab_id)]
+
+
+def test_word_like_symbols_only_match_when_written_as_code():
+    assert snippet_symbols("how do I add an event listener", "javascript", "js-fundamentals") == []
+    assert snippet_symbols("how do I push onto a stack", "javascript", "js-algorithms") == []
+    assert snippet_symbols("what does `add` return?", "javascript", "js-fundamentals") == [["add"]]
+    assert snippet_symbols("why does add(2, 3) give 5", "javascript", "js-fundamentals") == [["add"]]
+
+
+def test_identifier_like_symbols_match_in_prose():
+    assert snippet_symbols("when does fetchdata retry", "javascript", "js-fundamentals") == [["fetchData"]]
+    assert snippet_symbols("how does flood_fill recurse", "python", "python-algorithms") == [["flood_fill"]]
+
+
+def full_set_size(manager):
+    return sum(len(labs) for labs in manager.labs.values())
+
+
+def test_current_cursor_has_no_changes(content_dir):
+    manager = main.LabManager()
+    cursor = manager.get_changes("")["cursor"]
+
+    changes = manager.get_changes(cursor)
+    assert changes["cursor"] == cursor
+    assert changes["changed"] == [] and changes["removed"] == []
+
+
+@pytest.mark.parametrize("cursor", ["other-epoch:1", "garbage", "{epoch}:not-a-number", "{epoch}:999999"])
+def test_foreign_malformed_or_future_cursors_get_the_full_set(content_dir, cursor):
+    manager = main.LabManager()
+
+    changes = manager.get_changes(cursor.format(epoch=manager.epoch))
+    assert len(changes["changed"]) == full_set_size(manager)
+
+
+def test_removed_labs_are_reported_after_the_cursor_only(content_dir):
+    manager = main.LabManager()
+    write_lab(content_dir, "a", "Lab A")
+    manager.reload_labs()
+    before_removal = manager.get_changes("")["cursor"]
+
+    (content_dir / "python" / "a.json").unlink()
+    manager.reload_labs()
+    changes = manager.get_changes(before_removal)
+    assert [(removal["skill"], removal["lab_id"]) for removal in changes["removed"]] == [("python", "a")]
+    assert changes["changed"] == []
+
+    assert manager.get_changes(changes["cursor"])["removed"] == []
+
+
+def test_title_edit_reports_the_lab_without_sections(content_dir):
+    manager = main.LabManager()
+    write_lab(content_dir, "a", "Lab A")
+    manager.reload_labs()
+    cursor = manager.get_changes("")["cursor"]
+
+    write_lab(content_dir, "a", "Lab A, revised")
+    manager.reload_labs()
+    changes = manager.get_changes(cursor)
+    assert changed_ids(changes) == {("python", "a")}
+    assert changes["changed"][0]["sections"] == []
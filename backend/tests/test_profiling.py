@@ -0,0 +1,37 @@
+import asyncio
+
+from profiling import RequestProfiler
+
+
+async def ok_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+def request(profiler, headers):
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": "/labs", "headers": headers}
+    asyncio.run(profiler(scope, None, send))
+    return dict(sent[0]["headers"])
+
+
+def test_profile_header_requires_the_token(tmp_path):
+    profiler = RequestProfiler(ok_app, output_dir=str(tmp_path), token="s3cret")
+
+    assert b"x-profile-id" not in request(profiler, [(b"x-profile", b"1")])
+    assert b"x-profile-id" not in request(RequestProfiler(ok_app, output_dir=str(tmp_path)), [(b"x-profile", b"")])
+    assert list(tmp_path.iterdir()) == []
+
+    assert b"x-profile-id" in request(profiler, [(b"x-profile", b"s3cret")])
+    assert len(list(tmp_path.glob("*.folded"))) == 1
+
+
+def test_only_the_newest_profiles_are_kept(tmp_path):
+    profiler = RequestProfiler(ok_app, output_dir=str(tmp_path), token="s3cret", max_profiles=2)
+    ids = [request(profiler, [(b"x-profile", b"s3cret")])[b"x-profile-id"].decode() for _ in range(4)]
+
+    assert sorted(path.stem for path in tmp_path.glob("*.folded")) == sorted(ids[2:])
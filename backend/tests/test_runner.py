@@ -0,0 +1,168 @@
+import asyncio
+import os
+import pickle
+import socket
+import sys
+import types
+
+import pytest
+
+from runner import ExerciseRunner
+
+CASES = [{"call": "find_duplicates([1, 2, 2])", "expected": [2]}]
+SECRET = "sk-test-must-not-leak"
+
+
+def run_submission(code, cases=CASES):
+    async def scenario():
+        runner = ExerciseRunner(size=1, timeout=2)
+        await runner.start()
+        try:
+            if runner.unavailable is not None:
+                pytest.skip(f"sandbox unavailable here: {runner.unavailable}")
+            first = await runner.run(code, cases)
+            # The worker must still serve honest results after whatever the submission tried
+            second = await runner.run("def find_duplicates(x): return [2]", cases)
+            return first, second
+        finally:
+            await runner.stop()
+
+    return asyncio.run(scenario())
+
+
+class _Touch:
+    def __init__(self, path):
+        self.path = path
+
+    def __reduce__(self):
+        return open, (self.path, "w")
+
+
+@pytest.fixture
+def secret_env(monkeypatch):
+    # Mirrors an API server that has loaded the key into its environment and the openai module
+    monkeypatch.setenv("OPENAI_API_KEY", SECRET)
+    monkeypatch.setitem(sys.modules, "openai", types.SimpleNamespace(api_key=SECRET))
+
+
+def test_correct_submission_passes():
+    outcome, _ = run_submission("def find_duplicates(x): return sorted({v for v in x if x.count(v) > 1})")
+    assert outcome["error"] is None
+    assert outcome["results"][0]["passed"]
+
+
+def test_api_key_is_not_reachable(secret_env, tmp_path):
+    secrets_file = tmp_path / ".env"
+    secrets_file.write_text(f"OPENAI_API_KEY={SECRET}\n")
+    secrets_file.chmod(0o644)
+    code = f"""
+import os, sys
+def find_duplicates(x):
+    found = [dict(os.environ)]
+    found.append(getattr(sys.modules.get('openai'), 'api_key', None))
+    for path in ({str(secrets_file)!r}, '/proc/1/environ', '/proc/self/environ'):
+        try:
+            found.append(open(path).read())
+        except OSError as e:
+            found.append(type(e).__name__)
+    return found
+"""
+    outcome, _ = run_submission(code)
+    assert SECRET not in repr(outcome)
+    assert outcome["results"][0]["actual"][:2] == [{}, None]
+
+
+def test_forged_frames_never_reach_the_parent(tmp_path):
+    marker = tmp_path / "unpickled"
+    payload = pickle.dumps(_Touch(str(marker)))
+    frame = len(payload).to_bytes(4, "big") + payload
+    forged = b'{"error": null, "results": [{"actual": [2]}], "forged": true}'
+    code = f"""
+import os
+for fd in range(256):
+    for data in ({frame!r}, len({forged!r}).to_bytes(4, 'big') + {forged!r}):
+        try:
+            os.write(fd, data)
+        except OSError:
+            pass
+def find_duplicates(x):
+    return []
+"""
+    outcome, after = run_submission(code)
+    assert not marker.exists()
+    assert "forged" not in outcome
+    assert not any(result["passed"] for result in outcome["results"])
+    assert after["results"][0]["passed"] is True
+
+
+def test_network_is_unreachable():
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(1)
+    listener.setblocking(False)
+    port = listener.getsockname()[1]
+    code = f"""
+import socket
+def find_duplicates(x):
+    socket.create_connection(('127.0.0.1', {port}), timeout=1)
+    return [2]
+"""
+    try:
+        outcome, _ = run_submission(code)
+        with pytest.raises(BlockingIOError):
+            listener.accept()
+    finally:
+        listener.close()
+    assert not outcome["results"][0]["passed"]
+
+
+def test_host_processes_are_invisible():
+    code = f"""
+import os
+def find_duplicates(x):
+    os.kill({os.getpid()}, 0)
+    return [2]
+"""
+    outcome, _ = run_submission(code)
+    assert "ProcessLookupError" in outcome["results"][0]["error"]
+
+
+def test_submission_cannot_fork_or_write_files():
+    code = """
+import os
+def find_duplicates(x):
+    errors = []
+    for attempt in (os.fork, lambda: os.mkdir('/escape'), lambda: open('/escape', 'w')):
+        try:
+            attempt()
+        except OSError as e:
+            errors.append(type(e).__name__)
+    return errors
+"""
+    outcome, _ = run_submission(code)
+    assert len(outcome["results"][0]["actual"]) == 3
+
+
+def test_time_limit_is_enforced():
+    outcome, after = run_submission("while True: pass")
+    assert outcome["error"].startswith("Time limit exceeded")
+    assert after["results"][0]["passed"] is True
+
+
+def test_cancelled_submission_returns_its_worker():
+    async def scenario():
+        runner = ExerciseRunner(size=1, timeout=1)
+        await runner.start()
+        try:
+            if runner.unavailable is not None:
+                pytest.skip(f"sandbox unavailable here: {runner.unavailable}")
+            request = asyncio.create_task(runner.run("while True: pass", CASES))
+            await asyncio.sleep(0.2)
+            request.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await request
+            return await asyncio.wait_for(runner.run("def find_duplicates(x): return [2]", CASES), timeout=5)
+        finally:
+            await runner.stop()
+
+    assert asyncio.run(scenario())["results"][0]["passed"] is True
@@ -0,0 +1,42 @@
+import asyncio
+
+from transcripts import JSONLTranscriptSink, TranscriptLog, summarize
+
+
+def entry(question):
+    return {
+        "skill": "python", "lab_id": "python-basics", "question": question, "response": "answer",
+        "relevant": True, "model": "gpt-4o-mini", "prompt_tokens": 10, "completion_tokens": 5,
+        "latency_ms": 100.0, "route_tier": "light", "route_score": 1.0
+    }
+
+
+def test_rotations_within_one_second_keep_every_file(tmp_path):
+    sink = JSONLTranscriptSink(str(tmp_path / "transcripts.jsonl"), max_bytes=1)
+    sink.open()
+    for number in range(5):
+        sink.write_batch([entry(f"question {number}")])
+    sink.close()
+
+    rotated = list(tmp_path.glob("transcripts.jsonl.*"))
+    assert len(rotated) == 5
+    assert sum(len(path.read_text().splitlines()) for path in rotated) == 5
+
+
+def test_summarize_reads_jsonl_logs_including_rotated_files(tmp_path):
+    path = str(tmp_path / "transcripts.jsonl")
+    log = TranscriptLog(JSONLTranscriptSink(path, max_bytes=500), batch_size=2, flush_interval=0.01)
+
+    async def record():
+        await log.start()
+        for number in range(12):
+            await log.record(**entry(f"What is a list {number % 3}?"))
+        await log.stop()
+
+    asyncio.run(record())
+    report = summarize(path)
+
+    assert report["labs"][0]["questions"] == 12
+    assert report["labs"][0]["prompt_tokens"] == 120
+    assert report["routes"][0]["tier"] == "light"
+    assert [question["asked"] for question in report["top_questions"]] == [4, 4, 4]
@@ -0,0 +1,261 @@
+import asyncio
+import glob
+import json
+import logging
+import os
+import sqlite3
+import sys
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger("codesafari.transcripts")
+
+TRANSCRIPT_COLUMNS = (
+    "created_at", "skill", "lab_id", "question", "response", "relevant",
+    "model", "prompt_tokens", "completion_tokens", "latency_ms", "route_tier", "route_score"
+)
+
+
+class SQLiteTranscriptSink:
+    """Append-only transcript table in a WAL-mode SQLite database"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.connection: Optional[sqlite3.Connection] = None
+
+    def open(self) -> None:
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS transcripts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                created_at REAL NOT NULL,
+                skill TEXT NOT NULL,
+                lab_id TEXT NOT NULL,
+                question TEXT NOT NULL,
+                response TEXT,
+                relevant INTEGER NOT NULL,
+                model TEXT,
+                prompt_tokens INTEGER,
+                completion_tokens INTEGER,
+                latency_ms REAL,
+                route_tier TEXT,
+                route_score REAL
+            )
+        """)
+        # Databases created before routing was logged lack the route columns
+        existing = {row[1] for row in self.connection.execute("PRAGMA table_info(transcripts)")}
+        for column, column_type in (("route_tier", "TEXT"), ("route_score", "REAL")):
+            if column not in existing:
+                self.connection.execute(f"ALTER TABLE transcripts ADD COLUMN {column} {column_type}")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS idx_transcripts_lab ON transcripts (skill, lab_id)")
+        self.connection.commit()
+
+    def write_batch(self, entries: List[Dict]) -> None:
+        placeholders = ", ".join("?" for _ in TRANSCRIPT_COLUMNS)
+        self.connection.executemany(
+            f"INSERT INTO transcripts ({', '.join(TRANSCRIPT_COLUMNS)}) VALUES ({placeholders})",
+            [tuple(entry.get(column) for column in TRANSCRIPT_COLUMNS) for entry in entries]
+        )
+        self.connection.commit()
+
+    def close(self) -> None:
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+class JSONLTranscriptSink:
+    """Append-only JSON Lines files, rotated once they reach a size limit"""
+
+    def __init__(self, path: str, max_bytes: int = 50 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.file = None
+
+    def open(self) -> None:
+        self.file = open(self.path, "a", encoding="utf-8")
+
+    def rotated_path(self) -> str:
+        """Timestamped name for the next rotated file, with a counter if that second is taken"""
+        base = f"{self.path}.{time.strftime('%Y%m%d-%H%M%S')}"
+        path = base
+        counter = 0
+        while os.path.exists(path):
+            counter += 1
+            path = f"{base}-{counter}"
+        return path
+
+    def rotate(self) -> None:
+        self.file.close()
+        os.replace(self.path, self.rotated_path())
+        self.file = open(self.path, "a", encoding="utf-8")
+
+    def write_batch(self, entries: List[Dict]) -> None:
+        self.file.write("".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries))
+        self.file.flush()
+        if self.file.tell() >= self.max_bytes:
+            self.rotate()
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class TranscriptLog:
+    """Queue chat transcripts in-process and persist them off the request path in batches"""
+
+    def __init__(self, sink, max_queue: int = 10000, batch_size: int = 100,
+                 flush_interval: float = 1.0, enqueue_timeout: float = 0.05):
+        self.sink = sink
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.dropped = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._writer: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.sink.open)
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._writer = asyncio.create_task(self._write_loop())
+
+    async def stop(self) -> None:
+        """Flush everything still queued, then close the sink"""
+        if self._writer is None:
+            return
+        await self._queue.put(None)
+        await self._writer
+        self._writer = None
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.sink.close)
+
+    async def record(self, **entry) -> None:
+        """Queue a transcript entry; waits briefly when the writer falls behind, then drops"""
+        if self._queue is None:
+            return
+        entry.setdefault("created_at", time.time())
+        try:
+            await asyncio.wait_for(self._queue.put(entry), timeout=self.enqueue_timeout)
+        except asyncio.TimeoutError:
+            self.dropped += 1
+
+    async def _write_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+
+        while not stopping:
+            batch = []
+            entry = await self._queue.get()
+            deadline = loop.time() + self.flush_interval
+
+            # Collect until the batch is full or the flush interval expires
+            while entry is not None:
+                batch.append(entry)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    entry = await asyncio.wait_for(self._queue.get(), timeout=max(0, deadline - loop.time()))
+                except asyncio.TimeoutError:
+                    break
+            stopping = entry is None
+
+            if batch:
+                try:
+                    await loop.run_in_executor(None, self.sink.write_batch, batch)
+                except Exception as e:
+                    self.dropped += len(batch)
+                    logger.error("failed to write %d transcripts: %s", len(batch), e)
+
+
+def create_transcript_log(target: str) -> TranscriptLog:
+    """Build a transcript log for a `.jsonl` file or a SQLite database path"""
+    if target.endswith(".jsonl"):
+        return TranscriptLog(JSONLTranscriptSink(target))
+    return TranscriptLog(SQLiteTranscriptSink(target))
+
+
+def load_jsonl(path: str, batch_size: int = 1000) -> sqlite3.Connection:
+    """Load a JSONL transcript log and its rotated files into an in-memory transcript table"""
+    sink = SQLiteTranscriptSink(":memory:")
+    sink.open()
+    paths = sorted(glob.glob(f"{glob.escape(path)}.*")) + ([path] if os.path.exists(path) else [])
+    for file_path in paths:
+        with open(file_path, encoding="utf-8") as transcripts:
+            batch = []
+            for line in transcripts:
+                if line.strip():
+                    batch.append(json.loads(line))
+                if len(batch) >= batch_size:
+                    sink.write_batch(batch)
+                    batch = []
+            if batch:
+                sink.write_batch(batch)
+    return sink.connection
+
+
+def summarize(path: str, limit: int = 20) -> Dict:
+    """Offline report of the most asked questions and token usage per lab and routing tier"""
+    if path.endswith(".jsonl"):
+        connection = load_jsonl(path)
+    else:
+        connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        top_questions = connection.execute("""
+            SELECT skill, lab_id, lower(trim(question)) AS normalized, COUNT(*) AS asked,
+                   SUM(COALESCE(prompt_tokens, 0) + COALESCE(completion_tokens, 0)) AS tokens
+            FROM transcripts
+            GROUP BY skill, lab_id, normalized
+            ORDER BY asked DESC
+            LIMIT ?
+        """, (limit,)).fetchall()
+        per_lab = connection.execute("""
+            SELECT skill, lab_id, COUNT(*), SUM(relevant),
+                   SUM(COALESCE(prompt_tokens, 0)), SUM(COALESCE(completion_tokens, 0)), AVG(latency_ms)
+            FROM transcripts
+            GROUP BY skill, lab_id
+            ORDER BY COUNT(*) DESC
+        """).fetchall()
+        per_tier = connection.execute("""
+            SELECT route_tier, model, COUNT(*), AVG(latency_ms),
+                   SUM(COALESCE(prompt_tokens, 0)), SUM(COALESCE(completion_tokens, 0))
+            FROM transcripts
+            WHERE route_tier IS NOT NULL
+            GROUP BY route_tier, model
+            ORDER BY COUNT(*) DESC
+        """).fetchall()
+    finally:
+        connection.close()
+
+    return {
+        "top_questions": [
+            {"skill": skill, "lab_id": lab_id, "question": question, "asked": asked, "tokens": tokens}
+            for skill, lab_id, question, asked, tokens in top_questions
+        ],
+        "labs": [
+            {
+                "skill": skill, "lab_id": lab_id, "questions": count, "relevant": relevant,
+                "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                "avg_latency_ms": round(latency or 0, 1)
+            }
+            for skill, lab_id, count, relevant, prompt_tokens, completion_tokens, latency in per_lab
+        ],
+        "routes": [
+            {
+                "tier": tier, "model": model, "questions": count, "avg_latency_ms": round(latency or 0, 1),
+                "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens
+            }
+            for tier, model, count, latency, prompt_tokens, completion_tokens in per_tier
+        ]
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python transcripts.py <transcripts.db | transcripts.jsonl>", file=sys.stderr)
+        sys.exit(1)
+    print(json.dumps(summarize(sys.argv[1]), indent=2))
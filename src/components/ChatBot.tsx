@@ -1,5 +1,5 @@
 import React, { useState, useRef, useEffect } from 'react';
-import { Send, Bot, User } from 'lucide-react';
+import { Send, Bot, User, Square } from 'lucide-react';
 
 interface Message {
   id: string;
@@ -8,6 +8,18 @@ interface Message {
   timestamp: Date;
 }
 
+interface ChatEvent {
+  type: 'typing' | 'progress' | 'token' | 'done' | 'cancelled' | 'error';
+  id: string;
+  text?: string;
+  response?: string;
+  detail?: string;
+  retry_after?: number;
+}
+
+const ERROR_TEXT = 'Sorry, I encountered an error. Please make sure the backend is running and try again.';
+const DROPPED_TEXT = 'The connection to the tutor was lost before this answer finished. Please ask again.';
+
 interface ChatBotProps {
   labId: string;
   skill: string;
@@ -25,7 +37,11 @@ const ChatBot: React.FC<ChatBotProps> = ({ labId, skill, labTitle }) => {
   ]);
   const [inputValue, setInputValue] = useState('');
   const [isLoading, setIsLoading] = useState(false);
+  const [pendingId, setPendingId] = useState<string | null>(null);
   const messagesEndRef = useRef<HTMLDivElement>(null);
+  const socketRef = useRef<WebSocket | null>(null);
+  // Mirrors pendingId for socket handlers, which are created once per connection
+  const pendingIdRef = useRef<string | null>(null);
 
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
@@ -35,6 +51,78 @@ const ChatBot: React.FC<ChatBotProps> = ({ labId, skill, labTitle }) => {
     scrollToBottom();
   }, [messages]);
 
+  useEffect(() => {
+    pendingIdRef.current = pendingId;
+  }, [pendingId]);
+
+  useEffect(() => {
+    const upsertAnswer = (id: string, update: (text: string) => string) => {
+      const answerId = `${id}-answer`;
+      setMessages(prev => {
+        if (prev.some(message => message.id === answerId)) {
+          return prev.map(message => message.id === answerId ? { ...message, text: update(message.text) } : message);
+        }
+        return [...prev, { id: answerId, text: update(''), isUser: false, timestamp: new Date() }];
+      });
+    };
+
+    // One persistent connection per lab session; answers stream back as tokens
+    const socket = new WebSocket(
+      `ws://localhost:8000/ws/chat?skill=${encodeURIComponent(skill.toLowerCase())}&lab_id=${encodeURIComponent(labId)}`
+    );
+
+    socket.onmessage = (event) => {
+      const data: ChatEvent = JSON.parse(event.data);
+
+      switch (data.type) {
+        case 'token':
+          upsertAnswer(data.id, text => text + (data.text || ''));
+          break;
+        case 'done':
+          upsertAnswer(data.id, () => data.response || '');
+          setIsLoading(false);
+          setPendingId(null);
+          break;
+        case 'cancelled':
+          upsertAnswer(data.id, text => text ? `${text} …` : 'Stopped.');
+          setIsLoading(false);
+          setPendingId(null);
+          break;
+        case 'error':
+          // Busy errors carry a retry hint and a message meant for the student
+          upsertAnswer(data.id, () => data.retry_after ? data.detail || ERROR_TEXT : ERROR_TEXT);
+          setIsLoading(false);
+          setPendingId(null);
+          break;
+      }
+    };
+
+    socket.onclose = () => {
+      // A dropped connection ends any answer in progress; new questions use the HTTP fallback
+      if (socketRef.current === socket) {
+        socketRef.current = null;
+        const droppedId = pendingIdRef.current;
+        if (droppedId) {
+          upsertAnswer(droppedId, text => text ? `${text} …\n\n${DROPPED_TEXT}` : DROPPED_TEXT);
+        }
+        setIsLoading(false);
+        setPendingId(null);
+      }
+    };
+
+    socketRef.current = socket;
+    return () => {
+      socketRef.current = null;
+      socket.close();
+    };
+  }, [labId, skill]);
+
+  const cancelMessage = () => {
+    if (pendingId && socketRef.current?.readyState === WebSocket.OPEN) {
+      socketRef.current.send(JSON.stringify({ type: 'cancel', id: pendingId }));
+    }
+  };
+
   const sendMessage = async (e: React.FormEvent) => {
     e.preventDefault();
     if (!inputValue.trim() || isLoading) return;
@@ -50,6 +138,14 @@ const ChatBot: React.FC<ChatBotProps> = ({ labId, skill, labTitle }) => {
     setInputValue('');
     setIsLoading(true);
 
+    const socket = socketRef.current;
+    if (socket && socket.readyState === WebSocket.OPEN) {
+      setPendingId(userMessage.id);
+      socket.send(JSON.stringify({ type: 'question', id: userMessage.id, question: inputValue }));
+      return;
+    }
+
+    // Fall back to a plain request if the socket is unavailable
     try {
       const response = await fetch('http://localhost:8000/chat', {
         method: 'POST',
@@ -67,7 +163,8 @@ const ChatBot: React.FC<ChatBotProps> = ({ labId, skill, labTitle }) => {
 
       const aiMessage: Message = {
         id: (Date.now() + 1).toString(),
-        text: data.response,
+        // 503 means the tutor is shedding load; its detail is written for the student
+        text: response.ok ? data.response : response.status === 503 ? data.detail : ERROR_TEXT,
         isUser: false,
         timestamp: new Date()
       };
@@ -76,7 +173,7 @@ const ChatBot: React.FC<ChatBotProps> = ({ labId, skill, labTitle }) => {
     } catch (error) {
       const errorMessage: Message = {
         id: (Date.now() + 1).toString(),
-        text: 'Sorry, I encountered an error. Please make sure the backend is running and try again.',
+        text: ERROR_TEXT,
         isUser: false,
         timestamp: new Date()
       };
@@ -110,7 +207,7 @@ const ChatBot: React.FC<ChatBotProps> = ({ labId, skill, labTitle }) => {
             </div>
           </div>
         ))}
-        {isLoading && (
+        {isLoading && !messages.some(message => message.id === `${pendingId}-answer`) && (
           <div className="message ai-message">
             <div className="message-icon">
               <Bot className="w-4 h-4" />
@@ -137,9 +234,15 @@ const ChatBot: React.FC<ChatBotProps> = ({ labId, skill, labTitle }) => {
             className="chat-input"
             disabled={isLoading}
           />
-          <button type="submit" className="chat-send-button" disabled={isLoading || !inputValue.trim()}>
-            <Send className="w-4 h-4" />
-          </button>
+          {pendingId ? (
+            <button type="button" onClick={cancelMessage} className="chat-send-button" aria-label="Stop answer">
+              <Square className="w-4 h-4" />
+            </button>
+          ) : (
+            <button type="submit" className="chat-send-button" disabled={isLoading || !inputValue.trim()}>
+              <Send className="w-4 h-4" />
+            </button>
+          )}
         </div>
       </form>
     </div>